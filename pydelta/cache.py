@@ -0,0 +1,188 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from . import checker
+from . import options
+
+__CACHE = collections.OrderedDict()
+__CACHE_LOCK = threading.Lock()
+HITS = 0
+
+__STORE_LOCK = threading.Lock()
+__STORE_SIZE = None
+__EVICT_LOCK = threading.Lock()
+
+def new_digest():
+    """Returns a hash object for computing keys as in :meth:`digest`, to which the rendered candidate still needs to be added.
+    The key also covers the command, the memory limit and the comparator arguments, so that entries of the persistent store
+    from :code:`--cache-dir` are never used for a different setup. The timeout is not part of the key, as timeouts are never persisted,
+    instead :meth:`lookup` ignores results that took longer than the current timeout."""
+    h = hashlib.sha256()
+    h.update(json.dumps([
+        options.args().cmd,
+        options.args().cpu_time,
+        options.args().memout,
+        options.args().worker_mode,
+        options.args().input_mode,
+        options.args().ignore_exitcode,
+        options.args().ignore_output,
+        options.args().match_out,
+        options.args().match_err,
+        options.args().max_output,
+    ]).encode('utf8'))
+    return h
+
+def digest(text):
+    """Computes the key for a rendered candidate :code:`text`."""
+    h = new_digest()
+    h.update(text.encode('utf8'))
+    return h.hexdigest()
+
+class DigestWriter:
+    """A file object that computes the key (see :meth:`digest`) of everything written to it
+    and passes the text on to the file object :code:`out`.
+    Allows to compute the key while writing a candidate with :meth:`parser.write_smtlib`."""
+    def __init__(self, out):
+        self.out = out
+        self.hash = new_digest()
+
+    def write(self, text):
+        self.hash.update(text.encode('utf8'))
+        return self.out.write(text)
+
+    def key(self):
+        """Returns the key of the text written so far."""
+        return self.hash.hexdigest()
+
+def __store_path(key):
+    """Returns the filename of :code:`key` within the persistent store."""
+    return os.path.join(options.args().cache_dir, key[:2], key[2:] + '.json')
+
+def __store_lookup(key):
+    """Reads :code:`key` from the persistent store, returns :code:`None` if it is not present."""
+    filename = __store_path(key)
+    try:
+        with open(filename) as f:
+            res = checker.ExecResult(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        return None
+    try:
+        # mark as recently used for the eviction
+        os.utime(filename)
+    except OSError:
+        pass
+    return res
+
+def __disk_usage(st):
+    """Returns the disk space (in bytes) used by a file with the given :meth:`os.stat` result.
+    Small entries take up at least one block, hence the size of the file would be far too small."""
+    return st.st_blocks * 512
+
+def __store_write(key, result):
+    """Writes :code:`result` for :code:`key` to the persistent store.
+    The entry is written to a temporary file first and then atomically moved in place,
+    hence other pydelta processes never see partial entries.
+    The size of the store is tracked incrementally, and it is only scanned by :meth:`evict_store` once it exceeds the limit."""
+    global __STORE_SIZE
+    filename = __store_path(key)
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok = True)
+        fd, tmpname = tempfile.mkstemp(dir = os.path.dirname(filename), prefix = '.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(result._asdict(), f)
+        os.replace(tmpname, filename)
+        size = __disk_usage(os.stat(filename))
+    except OSError as err:
+        logging.debug('Writing to the cache directory failed: %s', err)
+        return
+    with __STORE_LOCK:
+        if __STORE_SIZE is not None:
+            __STORE_SIZE += size
+            if __STORE_SIZE <= options.args().cache_dir_size * 1024 * 1024:
+                return
+    evict_store()
+
+def evict_store():
+    """Determines the size of the persistent store and removes the least recently used entries
+    until it is smaller than :code:`--cache-dir-size`.
+    Files may be removed concurrently by other processes, hence all errors are ignored."""
+    global __STORE_SIZE
+    if options.args().cache_dir is None:
+        return
+    if not __EVICT_LOCK.acquire(blocking = False):
+        # another thread is scanning the store right now
+        return
+    try:
+        entries = []
+        total = 0
+        for root, _, files in os.walk(options.args().cache_dir):
+            for filename in files:
+                if filename.startswith('.tmp-'):
+                    # written by some process right now
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                size = __disk_usage(st)
+                entries.append((st.st_mtime, size, path))
+                total += size
+        limit = options.args().cache_dir_size * 1024 * 1024
+        if total > limit:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= limit * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+        with __STORE_LOCK:
+            __STORE_SIZE = total
+    finally:
+        __EVICT_LOCK.release()
+
+def lookup(key, timeout = None):
+    """Returns the cached :class:`checker.ExecResult` for :code:`key` or :code:`None`.
+    If :code:`timeout` is given, a cached timeout for a smaller timeout is ignored, as the result may be different now.
+    Falls back to the persistent store if :code:`--cache-dir` is given, ignoring results that took longer than :code:`timeout`."""
+    global HITS
+    with __CACHE_LOCK:
+        res = __CACHE.get(key, None)
+        if res is not None and timeout is not None and res.timeout and res.runtime < timeout:
+            return None
+        if res is not None:
+            __CACHE.move_to_end(key)
+            HITS += 1
+            return res
+    if options.args().cache_dir is None:
+        return None
+    res = __store_lookup(key)
+    if res is not None and timeout and res.runtime > timeout:
+        # the entry is from a run with a larger timeout, this check would time out now
+        return None
+    if res is not None:
+        with __CACHE_LOCK:
+            HITS += 1
+        store(key, res, persistent = False)
+    return res
+
+def store(key, result, persistent = True):
+    """Stores :code:`result` for :code:`key`. Evicts the least recently used entries if the cache
+    grows beyond :code:`--cache-size`.
+    Unless :code:`result` is a timeout, it is also added to the persistent store if :code:`--cache-dir` is given."""
+    if options.args().cache_size > 0:
+        with __CACHE_LOCK:
+            __CACHE[key] = result
+            __CACHE.move_to_end(key)
+            while len(__CACHE) > options.args().cache_size:
+                __CACHE.popitem(last = False)
+    if persistent and options.args().cache_dir is not None and not options.args().run_unchecked and not result.timeout:
+        __store_write(key, result)
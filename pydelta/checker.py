@@ -1,56 +1,740 @@
+import asyncio
+import codecs
 import collections
 import logging
+import math
+import os
 import re
 import resource
+import select
+import shutil
+import signal
 import subprocess
+import tempfile
+import threading
 import time
 
 from . import options
+from . import parser
+from . import semantics
 
-ExecResult = collections.namedtuple('ExecResult', ['exitcode', 'stdout', 'stderr', 'runtime'])
-__REFERENCE = ExecResult(-1, '', '', -1)
+ExecResult = collections.namedtuple('ExecResult', ['exitcode', 'stdout', 'stderr', 'runtime', 'timeout'])
+"""The result of a check. If the check timed out, :code:`runtime` is the timeout that was used."""
+__REFERENCE = ExecResult(-1, '', '', -1, False)
 CHECKS = 0
 TIMEOUTS = 0
+KILLED = 0
+DECIDED_EARLY = 0
+RETRIES = 0
+RETRIES_ACCEPTED = 0
+# with --cpu-time, checks are stopped after this multiple of --timeout in wall-clock time
+__CPU_TIME_WALL_FACTOR = 10
+# peak memory usage of recent checks for --adaptive-threads
+__PEAK_MEMORY = collections.deque(maxlen = 20)
+# seconds between two samples of the peak memory usage of a running check
+__MEMORY_SAMPLE_INTERVAL = 0.2
+# runtimes of recent checks for --adaptive-timeout
+__ACCEPTED_RUNTIMES = collections.deque(maxlen = 5)
+__REJECTED_RUNTIMES = collections.deque(maxlen = 100)
+__RUNTIMES_LOCK = threading.Lock()
+__ADAPTIVE_MIN_SAMPLES = 10
+# number of characters before the new output that are searched again by OutputMatcher
+__MATCH_OVERLAP = 4096
 
 def limit_memory():
     """Apply memory limit given by :code:`--memout`."""
     if options.args().memout != 0:
         resource.setrlimit(resource.RLIMIT_AS, (options.args().memout * 1024 * 1024, resource.RLIM_INFINITY))
 
-def execute(cmd, inputfile):
-    """Executes :code:`cmd` on :code:`inputfile`."""
+def limit_resources(timeout):
+    """Apply memory limit given by :code:`--memout` and, with :code:`--cpu-time`, the CPU time limit :code:`timeout`."""
+    limit_memory()
+    if options.args().cpu_time and timeout != 0:
+        resource.setrlimit(resource.RLIMIT_CPU, (timeout, timeout + 1))
+
+def signal_process_group(proc, sig):
+    """Sends :code:`sig` to the process group of :code:`proc`, if :code:`proc` is still running.
+    Solvers are started in their own session, hence this also reaches all processes they spawned."""
+    if proc.poll() is not None:
+        return
     try:
-        global CHECKS
-        CHECKS += 1
-        if options.args().run_unchecked:
-            return ExecResult(0, '', '', 0)
-        start = time.time()
-        timeout = None if options.args().timeout == 0 else options.args().timeout
-        proc = subprocess.Popen(cmd + [inputfile], stdout = subprocess.PIPE, stderr = subprocess.PIPE, preexec_fn = limit_memory)
-        out, err = proc.communicate(timeout = timeout)
-        duration = time.time() - start
-        return ExecResult(proc.returncode, out.decode('utf8').strip(), err.decode('utf8').strip(), duration)
+        os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def stop_process(proc):
+    """Terminates :code:`proc`, kills it if it does not terminate in time."""
+    signal_process_group(proc, signal.SIGTERM)
+    try:
+        proc.wait(timeout = 2)
     except subprocess.TimeoutExpired:
-        global TIMEOUTS
-        TIMEOUTS += 1
-        proc.terminate()
+        signal_process_group(proc, signal.SIGKILL)
+    try:
+        proc.wait(timeout = 2)
+    except subprocess.TimeoutExpired:
+        logging.warning('Killing pid %d failed. Please check manually to avoid memory exhaustion.', proc.pid)
+
+def automatic_timeout(runtime):
+    """Returns the automatic timeout for checks that are expected to take :code:`runtime` seconds."""
+    return max(int(runtime + 1) * 2, 1)
+
+def record_runtime(result, accepted):
+    """Adds the runtime of a check to the statistics for :code:`--adaptive-timeout`. Timeouts are ignored."""
+    if result is None or result.timeout:
+        return
+    with __RUNTIMES_LOCK:
+        if accepted:
+            __ACCEPTED_RUNTIMES.append(result.runtime)
+        else:
+            __REJECTED_RUNTIMES.append(result.runtime)
+
+def record_memory(peak):
+    """Adds the peak memory usage (in bytes) of a check to the statistics for :code:`--adaptive-threads`."""
+    with __RUNTIMES_LOCK:
+        __PEAK_MEMORY.append(peak)
+
+def get_check_memory():
+    """Returns the expected peak memory usage (in bytes) of a check, which is the maximum of the recent checks,
+    or the limit from :code:`--memout` if no check has been observed yet. Returns :code:`None` if nothing is known."""
+    with __RUNTIMES_LOCK:
+        if __PEAK_MEMORY:
+            return max(__PEAK_MEMORY)
+    if options.args().memout != 0:
+        return options.args().memout * 1024 * 1024
+    return None
+
+def get_timeout():
+    """Returns the timeout for the next check.
+    With :code:`--adaptive-timeout`, the timeout is computed by :meth:`automatic_timeout`
+    from the runtimes of the most recently accepted checks and the 95% quantile of the runtimes of recently rejected checks,
+    but never exceeds :code:`--timeout`.
+    Thus, the timeout shrinks as the input gets smaller."""
+    limit = options.args().timeout
+    if not options.args().adaptive_timeout or limit == 0:
+        return limit
+    with __RUNTIMES_LOCK:
+        if not __ACCEPTED_RUNTIMES:
+            return limit
+        runtime = max(__ACCEPTED_RUNTIMES)
+        if len(__REJECTED_RUNTIMES) >= __ADAPTIVE_MIN_SAMPLES:
+            rejected = sorted(__REJECTED_RUNTIMES)
+            runtime = max(runtime, rejected[int(0.95 * (len(rejected) - 1))])
+    return min(limit, automatic_timeout(runtime))
+
+def retry_timeout(timeout):
+    """Returns the larger timeout for checking a candidate again that timed out with :code:`timeout`,
+    or :code:`None` if it is not checked again.
+    Timeouts that were tightened by :code:`--adaptive-timeout` are retried with :code:`--timeout`,
+    and with :code:`--retry-timeouts` the candidates are retried once more with the given multiple of :code:`--timeout`."""
+    if timeout < options.args().timeout:
+        return options.args().timeout
+    if options.args().retry_timeouts > 1 and timeout == options.args().timeout:
+        return int(math.ceil(timeout * options.args().retry_timeouts))
+    return None
+
+class ProcessTracker:
+    """Keeps track of running solver processes, so that they can be stopped as soon as their results are not needed anymore."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.procs = set()
+        self.cancelled = False
+
+    def add(self, proc):
+        """Registers :code:`proc`. Stops it immediately and returns :code:`False` if :meth:`cancel` was already called."""
+        with self.lock:
+            if not self.cancelled:
+                self.procs.add(proc)
+                return True
+        stop_process(proc)
+        return False
+
+    def remove(self, proc):
+        """Unregisters :code:`proc`. Returns whether it was stopped by :meth:`cancel`."""
+        with self.lock:
+            self.procs.discard(proc)
+            return self.cancelled
+
+    def cancel(self):
+        """Terminates all registered processes and all processes registered afterwards."""
+        with self.lock:
+            self.cancelled = True
+            procs = list(self.procs)
+        for proc in procs:
+            signal_process_group(proc, signal.SIGTERM)
+
+class CandidateInput:
+    """A file that candidates are written to before the command is executed on them, as selected by :code:`--input-mode`.
+    Unless the mode is :code:`tempfile`, the file is created once and reused for all candidates,
+    hence it must only be used by one check at a time (see :meth:`acquire_input`).
+    For :code:`memfd` and :code:`stdin`, the file only lives in memory (if :meth:`os.memfd_create` is available),
+    otherwise it is created in :code:`--input-dir`."""
+    def __init__(self, mode):
+        self.mode = mode
+        self.file = None
+        self.path = None
+        self.remove = False
+        if mode == 'tempfile':
+            return
+        if mode in ['memfd', 'stdin'] and hasattr(os, 'memfd_create'):
+            fd = os.memfd_create('pydelta-candidate')
+            self.path = '/dev/fd/{}'.format(fd)
+        else:
+            fd, self.path = tempfile.mkstemp(prefix = 'pydelta-', suffix = '.smt2', dir = options.args().input_dir)
+            self.remove = True
+        self.file = os.fdopen(fd, 'w')
+
+    def open(self):
+        """Returns the file object the next candidate is written to."""
+        if self.mode == 'tempfile':
+            self.file = tempfile.NamedTemporaryFile('w', suffix = '.smt2')
+            self.path = self.file.name
+        else:
+            self.file.seek(0)
+            self.file.truncate()
+        return self.file
+
+    def command(self, cmd):
+        """Returns the command line and additional arguments for :class:`subprocess.Popen`
+        to execute :code:`cmd` on the current candidate."""
+        if self.mode == 'stdin':
+            os.lseek(self.file.fileno(), 0, os.SEEK_SET)
+            return cmd, {'stdin': self.file.fileno()}
+        if self.mode == 'memfd':
+            return cmd + [self.path], {'pass_fds': (self.file.fileno(),)}
+        return cmd + [self.path], {}
+
+    def finish(self):
+        """Releases the current candidate. Temporary files are removed, reused files are kept."""
+        if self.mode == 'tempfile' and self.file is not None:
+            try:
+                self.file.close()
+            except FileNotFoundError:
+                logging.info('Removing the temporary file failed.')
+            self.file = None
+
+    def close(self):
+        """Closes the file and removes it from the file system if necessary."""
+        self.finish()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            if self.remove:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+
+__IDLE_INPUTS = []
+__INPUTS_LOCK = threading.Lock()
+
+def acquire_input():
+    """Returns an idle :class:`CandidateInput`, which must be given back using :meth:`release_input`."""
+    with __INPUTS_LOCK:
+        if __IDLE_INPUTS:
+            return __IDLE_INPUTS.pop()
+    return CandidateInput(options.args().input_mode)
+
+def release_input(inp):
+    """Marks :code:`inp` as idle again."""
+    inp.finish()
+    with __INPUTS_LOCK:
+        __IDLE_INPUTS.append(inp)
+
+def close_inputs():
+    """Closes all idle :class:`CandidateInput` objects."""
+    with __INPUTS_LOCK:
+        for inp in __IDLE_INPUTS:
+            inp.close()
+        __IDLE_INPUTS.clear()
+
+def __command(cmd, inputfile):
+    """Returns the command line and additional arguments for :class:`subprocess.Popen` to execute :code:`cmd` on :code:`inputfile`,
+    which is either a filename or a :class:`CandidateInput`."""
+    if isinstance(inputfile, CandidateInput):
+        return inputfile.command(cmd)
+    return cmd + [inputfile], {}
+
+def __cancelled():
+    """Counts a check that was cancelled by a :class:`ProcessTracker`."""
+    global KILLED
+    KILLED += 1
+
+class OutputMatcher:
+    """Collects the output of a check while it arrives and decides as early as possible whether it matches :code:`reference`.
+    If the output is compared to the reference output, a mismatch is known as soon as the output of one stream deviates.
+    If :code:`--match-out` or :code:`--match-err` are given and the exit code is ignored,
+    a match is known as soon as all patterns were found.
+    The captured output of every stream is limited to :code:`--max-output`, the remaining output is dropped."""
+    def __init__(self, reference, overlap):
+        self.reference = reference
+        self.overlap = overlap
+        self.limit = options.args().max_output * 1024
+        self.sizes = [0, 0]
+        self.decoders = [codecs.getincrementaldecoder('utf8')(errors = 'replace') for _ in range(2)]
+        self.text = ['', '']
+        self.patterns = {}
+        if options.args().match_out is not None:
+            self.patterns[0] = re.compile(options.args().match_out)
+        if options.args().match_err is not None:
+            self.patterns[1] = re.compile(options.args().match_err)
+        self.verdict = None
+
+    def add(self, index, chunk):
+        """Adds :code:`chunk` to the output of stdout (:code:`index = 0`) or stderr (:code:`index = 1`)."""
+        if self.limit > 0:
+            chunk = chunk[:self.limit - self.sizes[index]]
+        if not chunk:
+            return
+        self.sizes[index] += len(chunk)
+        start = len(self.text[index])
+        self.text[index] += self.decoders[index].decode(chunk)
+        if self.verdict is None and self.reference is not None:
+            self.verdict = self.__decide(index, start)
+
+    def __decide(self, index, start):
+        """Returns whether the output matches the reference, or :code:`None` if this is not known yet."""
+        if options.args().ignore_output:
+            return None
+        if not self.patterns:
+            expected = [self.reference.stdout, self.reference.stderr][index]
+            text = self.text[index].lstrip()
+            if len(text) <= len(expected):
+                return None if expected.startswith(text) else False
+            return None if text.startswith(expected) and text[len(expected):].isspace() else False
+        if not options.args().ignore_exitcode or index not in self.patterns:
+            return None
+        if self.patterns[index].search(self.text[index], max(0, start - self.overlap)) is not None:
+            del self.patterns[index]
+        return True if not self.patterns else None
+
+    def result(self, exitcode, runtime):
+        """Returns the :class:`ExecResult` for the output collected so far."""
+        out, err = [text + decoder.decode(b'', final = True) for text, decoder in zip(self.text, self.decoders)]
+        return ExecResult(exitcode, out.strip(), err.strip(), runtime, False)
+
+def __decided_early(proc):
+    """Counts a check whose result was known before the process terminated."""
+    global DECIDED_EARLY
+    if proc.returncode is None:
+        DECIDED_EARLY += 1
+
+def peak_memory(pid):
+    """Returns the peak memory usage (in bytes) of the process :code:`pid` according to :code:`/proc/<pid>/status`,
+    or :code:`None` if it is unknown, e.g. because the process already terminated.
+    Other than the resource usage from :meth:`os.wait4`, this only covers the memory used after the command was executed."""
+    try:
+        with open('/proc/{}/status'.format(pid)) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def __read_output(proc, matcher, deadline, sample = False):
+    """Passes the output of :code:`proc` to :code:`matcher` until both streams are closed or the result is known.
+    If :code:`sample` is true, the peak memory usage of :code:`proc` is sampled regularly using :meth:`peak_memory`.
+    Returns :code:`False` if the :code:`deadline` passed, otherwise :code:`True`, and the largest sample."""
+    fds = {proc.stdout.fileno(): 0, proc.stderr.fileno(): 1}
+    peak = None
+    sampled = 0
+    while fds and matcher.verdict is None:
+        if sample and time.time() - sampled >= __MEMORY_SAMPLE_INTERVAL:
+            peak = max(filter(None, [peak, peak_memory(proc.pid)]), default = None)
+            sampled = time.time()
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False, peak
+        if sample:
+            remaining = __MEMORY_SAMPLE_INTERVAL if remaining is None else min(remaining, __MEMORY_SAMPLE_INTERVAL)
+        rlist, _, _ = select.select(list(fds), [], [], remaining)
+        for fd in rlist:
+            chunk = os.read(fd, 65536)
+            if chunk:
+                matcher.add(fds[fd], chunk)
+            else:
+                del fds[fd]
+    return True, peak
+
+def __wait_rusage(proc, deadline):
+    """Waits for :code:`proc` to terminate like :meth:`subprocess.Popen.wait`, but using :meth:`os.wait4`.
+    Returns the resource usage of the process, or :code:`None` if it was reaped somewhere else."""
+    delay = 0.0005
+    while True:
         try:
-            proc.wait(timeout = 2)
-        except subprocess.TimeoutExpired:
-            proc.kill()
+            pid, status, usage = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+        except ChildProcessError:
+            proc.wait()
+            return None
+        if pid != 0:
+            proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+            return usage
+        if deadline is not None and time.time() >= deadline:
+            raise subprocess.TimeoutExpired(proc.args, 0)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+def __record_check_memory(peak, usage):
+    """Records the peak memory usage of a check by :meth:`record_memory`, given the largest sample from :meth:`peak_memory`
+    and the resource usage from :meth:`os.wait4`, both of which may be :code:`None`."""
+    if usage is not None and usage.ru_maxrss > resource.getrusage(resource.RUSAGE_SELF).ru_maxrss:
+        # the peak of the child includes the memory it shared with pydelta before exec, only larger values are caused by the command
+        peak = max(filter(None, [peak, usage.ru_maxrss * 1024]))
+    if peak is not None:
+        record_memory(peak)
+
+def __stop_decided(proc):
+    """Stops :code:`proc` once its result is known (see :class:`OutputMatcher`) like :meth:`stop_process`,
+    but reaps it using :meth:`os.wait4`, such that its resource usage is available in any case.
+    Returns the resource usage of the process, or :code:`None` if it was reaped somewhere else or could not be stopped."""
+    try:
+        # the process may have terminated already
+        return __wait_rusage(proc, time.time())
+    except subprocess.TimeoutExpired:
+        pass
+    __decided_early(proc)
+    for sig in [signal.SIGTERM, signal.SIGKILL]:
+        try:
+            # the process is not reaped yet, hence its pid was not reused
+            os.killpg(proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
         try:
-            proc.wait(timeout = 2)
+            return __wait_rusage(proc, time.time() + 2)
         except subprocess.TimeoutExpired:
-            logging.warning('Killing pid %d failed. Please check manually to avoid memory exhaustion.', proc.pid)
-        return ExecResult(-1, '', '', 0)
+            pass
+    logging.warning('Killing pid %d failed. Please check manually to avoid memory exhaustion.', proc.pid)
+    return None
+
+def execute(cmd, inputfile, tracker = None, reference = True, timeout = None):
+    """Executes :code:`cmd` on :code:`inputfile`, which is either a filename or a :class:`CandidateInput`.
+    Unless :code:`reference` is :code:`False`, the output is matched against the reference result while it arrives
+    and the process is stopped as soon as the result is known (see :class:`OutputMatcher`).
+    The process is stopped after :code:`timeout` seconds, which defaults to :code:`--timeout`.
+    With :code:`--cpu-time`, the runtime is the CPU time of the process and its children and the timeout limits the CPU time.
+    The peak memory usage of the process is recorded by :meth:`record_memory`.
+    Returns :code:`None` if the process is cancelled by the given :class:`ProcessTracker`."""
+    global CHECKS
+    global TIMEOUTS
+    CHECKS += 1
+    if options.args().run_unchecked:
+        return ExecResult(0, '', '', 0, False)
+    start = time.time()
+    if timeout is None:
+        timeout = options.args().timeout
+    wall_timeout = timeout
+    if options.args().cpu_time:
+        # only a safeguard for processes that do not use the CPU
+        wall_timeout *= __CPU_TIME_WALL_FACTOR
+    deadline = None if wall_timeout == 0 else start + wall_timeout
+    matcher = OutputMatcher(__REFERENCE if reference else None, __MATCH_OVERLAP)
+    args, kwargs = __command(cmd, inputfile)
+    proc = subprocess.Popen(args, stdout = subprocess.PIPE, stderr = subprocess.PIPE, preexec_fn = lambda: limit_resources(timeout),
+                            start_new_session = True, **kwargs)
+    if tracker is not None and not tracker.add(proc):
+        __cancelled()
+        return None
+    usage = None
+    peak = None
+    try:
+        finished, peak = __read_output(proc, matcher, deadline, options.args().adaptive_threads)
+        if finished and matcher.verdict is None:
+            usage = __wait_rusage(proc, deadline)
+    except subprocess.TimeoutExpired:
+        finished = False
+    except KeyboardInterrupt:
+        stop_process(proc)
+        raise
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+    if tracker is not None and tracker.remove(proc):
+        stop_process(proc)
+        __cancelled()
+        return None
+    if finished and matcher.verdict is not None:
+        if options.args().adaptive_threads:
+            peak = max(filter(None, [peak, peak_memory(proc.pid)]), default = None)
+        usage = __stop_decided(proc)
+    duration = time.time() - start
+    __record_check_memory(peak, usage)
+    if usage is not None and options.args().cpu_time:
+        duration = usage.ru_utime + usage.ru_stime
+        if proc.returncode == -signal.SIGXCPU or (proc.returncode == -signal.SIGKILL and timeout != 0 and duration >= timeout):
+            # killed because of RLIMIT_CPU
+            finished = False
+    if not finished:
+        TIMEOUTS += 1
+        stop_process(proc)
+        return ExecResult(-1, '', '', timeout, True)
+    return matcher.result(proc.returncode, duration)
+
+async def __stop_async_process(proc):
+    """Terminates the process group of the :code:`asyncio` process :code:`proc`, kills it if it does not terminate in time."""
+    for sig in [signal.SIGTERM, signal.SIGKILL]:
+        if proc.returncode is None:
+            try:
+                os.killpg(proc.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+        try:
+            await asyncio.wait_for(proc.wait(), timeout = 2)
+            return
+        except asyncio.TimeoutError:
+            pass
+    logging.warning('Killing pid %d failed. Please check manually to avoid memory exhaustion.', proc.pid)
+
+async def __read_stream(stream, index, matcher):
+    """Passes the output from the :code:`asyncio` :code:`stream` to :code:`matcher` until it is closed or the result is known."""
+    while matcher.verdict is None:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return
+        matcher.add(index, chunk)
+
+async def execute_async(cmd, inputfile, reference = True, timeout = None):
+    """Executes :code:`cmd` on :code:`inputfile` like :meth:`execute`, but as a coroutine based on :code:`asyncio`.
+    If the coroutine is cancelled, the process is stopped.
+    As :code:`asyncio` reaps the process itself, the CPU time is not available and :code:`--cpu-time` is not supported."""
+    global CHECKS
+    global TIMEOUTS
+    CHECKS += 1
+    if options.args().run_unchecked:
+        return ExecResult(0, '', '', 0, False)
+    start = time.time()
+    if timeout is None:
+        timeout = options.args().timeout
+    if timeout == 0:
+        timeout = None
+    matcher = OutputMatcher(__REFERENCE if reference else None, __MATCH_OVERLAP)
+    args, kwargs = __command(cmd, inputfile)
+    proc = await asyncio.create_subprocess_exec(*args, stdout = subprocess.PIPE, stderr = subprocess.PIPE,
+                                                preexec_fn = limit_memory, start_new_session = True, **kwargs)
+    readers = [asyncio.ensure_future(__read_stream(proc.stdout, 0, matcher)), asyncio.ensure_future(__read_stream(proc.stderr, 1, matcher))]
+    try:
+        pending = set(readers)
+        while pending and matcher.verdict is None:
+            remaining = None if timeout is None else start + timeout - time.time()
+            done, pending = await asyncio.wait(pending, timeout = remaining, return_when = asyncio.FIRST_COMPLETED)
+            if not done:
+                raise asyncio.TimeoutError()
+        if matcher.verdict is None:
+            await asyncio.wait_for(proc.wait(), timeout = None if timeout is None else max(0, start + timeout - time.time()))
+    except asyncio.TimeoutError:
+        TIMEOUTS += 1
+        await __stop_async_process(proc)
+        return ExecResult(-1, '', '', timeout, True)
+    except asyncio.CancelledError:
+        __cancelled()
+        await __stop_async_process(proc)
+        raise
+    finally:
+        for reader in readers:
+            reader.cancel()
+    duration = time.time() - start
+    if matcher.verdict is not None:
+        __decided_early(proc)
+        await __stop_async_process(proc)
+    return matcher.result(proc.returncode, duration)
+
+class SolverWorker:
+    """A long-lived solver process as used by :code:`--worker-mode`.
+    Candidates are passed via stdin, wrapped in :code:`(reset)` or :code:`(push 1)` / :code:`(pop 1)`,
+    and the end of the answer is detected by :code:`(echo ...)` commands on both stdout and stderr.
+    The process is restarted if it terminated or timed out."""
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.proc = None
+        self.header = None
+        self.counter = 0
+
+    def start(self):
+        """Starts the solver process."""
+        self.proc = subprocess.Popen(self.cmd, stdin = subprocess.PIPE, stdout = subprocess.PIPE, stderr = subprocess.PIPE,
+                                     preexec_fn = limit_memory, start_new_session = True)
+        os.set_blocking(self.proc.stdin.fileno(), False)
+        self.header = None
+
+    def stop(self):
+        """Stops the solver process."""
+        if self.proc is not None:
+            stop_process(self.proc)
+            self.proc = None
+
+    def __wrap(self, header, text, sentinel):
+        """Wraps :code:`header` and :code:`text` for the solver process, which is (re)started if necessary.
+        With :code:`push-pop`, the :code:`header` is only sent once after the process was started.
+        Finally, :code:`sentinel` is echoed to stderr and stdout."""
+        data = ''
+        if options.args().worker_mode == 'push-pop':
+            if self.proc is not None and self.header != header:
+                # the logic or the options changed, they can only be set in a new process
+                self.stop()
+        if self.proc is None or self.proc.poll() is not None:
+            self.start()
+        if options.args().worker_mode == 'push-pop':
+            if self.header is None:
+                self.header = header
+                data = header + '\n'
+            data += '(push 1)\n{}\n(pop 1)\n'.format(text)
+        else:
+            data = '(reset)\n{}\n{}\n'.format(header, text)
+        data += '(set-option :regular-output-channel "stderr")\n(echo "{0}")\n'.format(sentinel)
+        data += '(set-option :regular-output-channel "stdout")\n(echo "{0}")\n'.format(sentinel)
+        return data
+
+    def __communicate(self, data, sentinel, timeout):
+        """Writes :code:`data` to the solver and reads its output and error output until :code:`sentinel` shows up on both.
+        Returns the output and error output before the sentinel lines and whether the sentinels were found,
+        or :code:`None` if the timeout expired."""
+        in_fd = self.proc.stdin.fileno()
+        fds = [self.proc.stdout.fileno(), self.proc.stderr.fileno()]
+        deadline = None if timeout is None else time.time() + timeout
+        out = {fd: b'' for fd in fds}
+        searched = {fd: 0 for fd in fds}
+        found = {}
+        reading = list(fds)
+        while True:
+            for fd in reading:
+                if fd not in found:
+                    pos = out[fd].find(sentinel, searched[fd])
+                    if pos != -1:
+                        found[fd] = out[fd].rfind(b'\n', 0, pos) + 1
+                    searched[fd] = max(0, len(out[fd]) - len(sentinel))
+            if len(found) == len(fds):
+                # drop what was written after the sentinel on stderr, e.g. the answer to the last set-option
+                while select.select([fds[1]], [], [], 0)[0] and os.read(fds[1], 65536):
+                    pass
+                return out[fds[0]][:found[fds[0]]], out[fds[1]][:found[fds[1]]], True
+            if not reading:
+                return out[fds[0]], out[fds[1]], False
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+            rlist, wlist, _ = select.select(reading, [in_fd] if data else [], [], remaining)
+            if wlist:
+                try:
+                    written = os.write(in_fd, data[:65536])
+                    data = data[written:]
+                except BrokenPipeError:
+                    data = b''
+            for fd in rlist:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    reading.remove(fd)
+                out[fd] += chunk
+
+    def run(self, header, text, tracker = None, timeout = None):
+        """Passes :code:`header` and :code:`text` to the solver and returns the :class:`ExecResult`.
+        The solver is stopped after :code:`timeout` seconds, which defaults to :code:`--timeout`.
+        Returns :code:`None` if the process is cancelled by the given :class:`ProcessTracker`."""
+        global TIMEOUTS
+        self.counter += 1
+        sentinel = 'pydelta-sentinel-{}'.format(self.counter)
+        data = self.__wrap(header, text, sentinel)
+        start = time.time()
+        if timeout is None:
+            timeout = options.args().timeout
+        if timeout == 0:
+            timeout = None
+        if tracker is not None and not tracker.add(self.proc):
+            self.stop()
+            return None
+        try:
+            res = self.__communicate(data.encode('utf8'), sentinel.encode('utf8'), timeout)
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+        duration = time.time() - start
+        if tracker is not None and tracker.remove(self.proc):
+            self.stop()
+            return None
+        if res is None:
+            TIMEOUTS += 1
+            self.stop()
+            return ExecResult(-1, '', '', timeout, True)
+        out, err, alive = res
+        exitcode = 0
+        if not alive:
+            # the solver terminated, restart it next time
+            try:
+                exitcode = self.proc.wait(timeout = 2)
+            except subprocess.TimeoutExpired:
+                stop_process(self.proc)
+                exitcode = self.proc.returncode
+            self.proc = None
+        return ExecResult(exitcode, out.decode('utf8').strip(), err.decode('utf8').strip(), duration, False)
+
+__IDLE_WORKERS = []
+__WORKERS_LOCK = threading.Lock()
+
+def split_header(exprs):
+    """Splits :code:`exprs` into the :code:`set-logic` and :code:`set-option` commands and the remaining commands.
+    The former are not allowed after :code:`(push 1)`, hence :code:`--worker-mode push-pop` sends them separately."""
+    header = []
+    body = []
+    for expr in exprs:
+        if semantics.has_name(expr) and semantics.get_name(expr) in ['set-logic', 'set-option']:
+            header.append(expr)
+        else:
+            body.append(expr)
+    return header, body
+
+def execute_worker(cmd, header, text, tracker = None, timeout = None):
+    """Executes :code:`cmd` on :code:`header` and :code:`text` using an idle :class:`SolverWorker`, see :meth:`SolverWorker.run`.
+    Returns :code:`None` if the process is cancelled by the given :class:`ProcessTracker`."""
+    global CHECKS
+    CHECKS += 1
+    if options.args().run_unchecked:
+        return ExecResult(0, '', '', 0, False)
+    if tracker is not None and tracker.cancelled:
+        __cancelled()
+        return None
+    with __WORKERS_LOCK:
+        worker = __IDLE_WORKERS.pop() if __IDLE_WORKERS else SolverWorker(cmd)
+    try:
+        res = worker.run(header, text, tracker, timeout)
+        if res is None:
+            __cancelled()
+        return res
+    finally:
+        with __WORKERS_LOCK:
+            __IDLE_WORKERS.append(worker)
+
+def stop_workers():
+    """Stops all idle solver workers."""
+    with __WORKERS_LOCK:
+        for worker in __IDLE_WORKERS:
+            worker.stop()
+        __IDLE_WORKERS.clear()
 
 def compute_reference(cmd, inputfile):
     """Computes the reference result on the original input.
     Sets an automatic timeout if none was specified.
     """
     global __REFERENCE
-    __REFERENCE = execute(cmd, inputfile)
-    logging.info('Reference result: exit code %d after %.2f seconds', __REFERENCE.exitcode, __REFERENCE.runtime)
+    if options.args().worker_mode == 'push-pop':
+        header, body = split_header(parser.parse_smtlib_file(inputfile))
+        __REFERENCE = execute_worker(cmd, '\n'.join(map(parser.render_expression, header)), '\n'.join(map(parser.render_expression, body)))
+    elif options.args().worker_mode is not None:
+        __REFERENCE = execute_worker(cmd, '', open(inputfile).read())
+    else:
+        # the input is passed like the candidates, see --input-mode
+        inp = acquire_input()
+        try:
+            with open(inputfile) as f:
+                out = inp.open()
+                shutil.copyfileobj(f, out)
+                out.flush()
+            __REFERENCE = execute(cmd, inp, reference = False)
+        finally:
+            release_input(inp)
+    unit = 'seconds of CPU time' if options.args().cpu_time else 'seconds'
+    logging.info('Reference result: exit code %d after %.2f %s', __REFERENCE.exitcode, __REFERENCE.runtime, unit)
     if options.args().ignore_output:
         logging.info('Reference output is being ignored')
     else:
@@ -64,9 +748,11 @@ def compute_reference(cmd, inputfile):
             if not re.search(options.args().match_err, __REFERENCE.stderr):
                 logging.error('The pattern for stderr does not match the reference output')
                 return False
+    record_runtime(__REFERENCE, True)
     if options.args().timeout == 0:
-        options.args().timeout = max(int(__REFERENCE.runtime + 1) * 2, 1)
-        logging.info('Using automatic timeout of %d seconds (reference run took %.2f seconds)', options.args().timeout, __REFERENCE.runtime)
+        options.args().timeout = automatic_timeout(__REFERENCE.runtime)
+        logging.info('Using automatic timeout of %d %s (reference run took %.2f %s)',
+                     options.args().timeout, unit, __REFERENCE.runtime, unit)
     return True
 
 def matches_reference(result):
@@ -2,12 +2,16 @@ import logging
 import os
 import pprint
 import sys
+import tempfile
 import time
 
+from pydelta import cache
 from pydelta import checker
+from pydelta import hdd
 from pydelta import options
 from pydelta import manager
 from pydelta import mutator
+from pydelta import nodes
 from pydelta import parser
 
 def setup_logging():
@@ -23,6 +27,8 @@ def check_options():
         if options.args().max_threads <= 0:
             options.args().max_threads = os.cpu_count() + options.args().max_threads
         logging.info('Using up to %d threads.', options.args().max_threads)
+    if options.args().parse_processes <= 0:
+        options.args().parse_processes = os.cpu_count() + options.args().parse_processes
 
     if options.args().dump_config:
         pprint.pprint(vars(options.args()))
@@ -33,10 +39,24 @@ def check_options():
 
     if options.args().parse_only:
         # only parse and print
-        exprs = parser.parse_smtlib(open(options.args().inputfile).read())
-        print(parser.render_smtlib(exprs))
+        exprs = parser.parse_smtlib_file(options.args().inputfile, options.args().parse_processes)
+        parser.write_smtlib(exprs, sys.stdout)
+        print()
         sys.exit(0)
 
+    if options.args().adaptive_threads and options.args().engine != 'threads':
+        raise Exception('--adaptive-threads can only be used with --engine threads')
+    if options.args().cpu_time and options.args().worker_mode is not None:
+        raise Exception('--cpu-time can not be used with --worker-mode')
+    if options.args().input_mode == 'memfd' and not hasattr(os, 'memfd_create'):
+        raise Exception('--input-mode memfd is not supported on this platform')
+    if options.args().input_dir is None:
+        options.args().input_dir = '/dev/shm' if os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+
+    if options.args().cache_dir is not None:
+        os.makedirs(options.args().cache_dir, exist_ok = True)
+        cache.evict_store()
+
     # check executable
     if len(options.args().cmd) == 0:
         raise Exception('No executable was specified as command')
@@ -51,14 +71,46 @@ def do_reference_run():
         sys.exit(1)
 
 def parse_input():
-    return parser.parse_smtlib(open(options.args().inputfile).read())
+    exprs = parser.parse_smtlib_file(options.args().inputfile, options.args().parse_processes)
+    if options.args().intern_nodes:
+        exprs = nodes.intern_exprs(exprs)
+    return exprs
+
+def adopt(exprs):
+    """Prepares a simplified input for the next round."""
+    if options.args().intern_nodes:
+        return nodes.intern_exprs(exprs)
+    return exprs
+
+def run_hdd(m, original):
+    """Runs :meth:`hdd.hierarchical_reduction` on :code:`original` using the manager :code:`m`.
+    Returns the simplified input, the number of simplifications and whether the reduction was aborted."""
+    simplifications = 0
+    try:
+        start = time.time()
+        for simp in hdd.hierarchical_reduction(m, original):
+            simplifications += 1
+            logging.info('#%d: %s (%.2fs)', simplifications, simp.simplification, time.time() - start)
+            original = adopt(simp.exprs)
+            parser.write_smtlib_to_file(original, options.args().outputfile)
+            start = time.time()
+    except KeyboardInterrupt:
+        logging.warning('Aborting. See %s for results.', options.args().outputfile)
+        return original, simplifications, True
+    return original, simplifications, False
 
 def run_pydelta(original):
     mutator.collect_mutators(options.args())
     skip = options.args().skip
     simplifications = 0
-    m = manager.Manager()
-    while True:
+    if options.args().engine == 'asyncio':
+        m = manager.AsyncManager()
+    else:
+        m = manager.Manager()
+    aborted = False
+    if options.args().mode_hdd:
+        original, simplifications, aborted = run_hdd(m, original)
+    while not aborted:
         try:
             # do one simplification step
             start = time.time()
@@ -82,9 +134,20 @@ def run_pydelta(original):
             # write current status to file and continue
             logging.info('#%d: %s (%.2fs)', simplifications, simp.simplification, duration)
             skip = simp.counter
-            original = simp.exprs
+            original = adopt(simp.exprs)
             parser.write_smtlib_to_file(original, options.args().outputfile)
 
+    checker.stop_workers()
+    checker.close_inputs()
     logging.info('Performed %d checks and %d simplifications', checker.CHECKS, simplifications)
+    if cache.HITS > 0:
+        logging.info('Overall, %d checks were answered from the cache', cache.HITS)
     if checker.TIMEOUTS > 0:
         logging.info('Overall, checking timed out %d times', checker.TIMEOUTS)
+    if checker.KILLED > 0:
+        logging.info('Overall, %d checks were stopped early as their results were not needed anymore', checker.KILLED)
+    if checker.RETRIES > 0:
+        logging.info('Overall, %d checks were retried with a larger timeout after timing out, %d of them were accepted',
+                     checker.RETRIES, checker.RETRIES_ACCEPTED)
+    if checker.DECIDED_EARLY > 0:
+        logging.info('Overall, %d checks were stopped as soon as their output decided the result', checker.DECIDED_EARLY)
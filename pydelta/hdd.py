@@ -0,0 +1,59 @@
+import collections
+
+from . import manager
+from . import semantics
+
+def nodes_at_level(exprs, level):
+    """Returns the paths of all nodes on the given :code:`level` of :code:`exprs`, the commands being on level zero.
+    The heads of compound nodes are skipped, as removing them does not yield a valid term."""
+    paths = [[i] for i in range(len(exprs))]
+    for _ in range(level):
+        paths = [
+            p + [i]
+            for p in paths if not semantics.is_leaf(semantics.get_subtree(exprs, p))
+            for i in range(1, len(semantics.get_subtree(exprs, p)))
+        ]
+    return paths
+
+def remove_nodes(exprs, paths):
+    """Returns a copy of :code:`exprs` without the nodes at the given :code:`paths`, which all need to be on the same level."""
+    removed = collections.defaultdict(set)
+    for p in paths:
+        removed[tuple(p[:-1])].add(p[-1])
+    res = exprs
+    for parent, indices in removed.items():
+        node = semantics.get_subtree(exprs, parent)
+        res = semantics.replace_subtree(res, list(parent), [c for i, c in enumerate(node) if i not in indices])
+    return res
+
+def split(items, n):
+    """Splits :code:`items` into :code:`n` chunks of (almost) equal size."""
+    return [items[len(items) * i // n:len(items) * (i + 1) // n] for i in range(n)]
+
+def hierarchical_reduction(m, exprs):
+    """A generator that performs hierarchical delta debugging on :code:`exprs` and yields every accepted :class:`manager.Candidate`.
+    The input is processed level by level, starting with the commands. On every level, chunks of nodes are removed
+    in the style of ddmin: all chunks of the current size are checked concurrently using the manager :code:`m`,
+    and the chunks are made smaller only if none of them can be removed."""
+    level = 0
+    while True:
+        items = nodes_at_level(exprs, level)
+        if not items:
+            return
+        n = min(2, len(items))
+        while items:
+            candidates = (
+                manager.Candidate(0, 'hierarchical reduction (level {}, {} nodes)'.format(level, len(chunk)), remove_nodes(exprs, chunk))
+                for chunk in split(items, n)
+            )
+            simp = m.simplify(exprs, candidates = candidates)
+            if simp is not None:
+                exprs = simp.exprs
+                yield simp
+                items = nodes_at_level(exprs, level)
+                n = max(min(n - 1, len(items)), min(2, len(items)))
+            elif n < len(items):
+                n = min(2 * n, len(items))
+            else:
+                break
+        level += 1
@@ -1,11 +1,15 @@
+import asyncio
 import collections
-import copy
+import concurrent.futures
+import functools
 import logging
+import os
 import queue
 import sys
-import tempfile
 import threading
+import time
 
+from . import cache
 from . import checker
 from . import mutator
 from . import options
@@ -22,18 +26,171 @@ Candidate = collections.namedtuple('Candidate', ['counter', 'simplification', 'e
 :code:`simplification` contains the name of the applied mutator.
 """
 
+def generate_candidates(original, skip):
+    """A generator that produces all :class:`Candidate` objects for :code:`original` that are admissible in the current mode.
+    The candidates share all unmodified subtrees with :code:`original`, hence nodes must never be modified in place."""
+    original_size = semantics.node_count(original)
+    gen = mutator.MutationGenerator(skip)
+    for candidate in gen.generate_mutations(original):
+        if options.args().mode_aggressive:
+            if candidate[3] > original_size * (1 - options.args().aggressiveness):
+                continue
+        if options.args().mode_reduction_only:
+            if candidate[3] >= original_size:
+                continue
+        yield Candidate(candidate[0], candidate[1], candidate[2])
+
+def merge_candidates(original, candidates, is_valid):
+    """Combines the mutations of multiple valid :code:`candidates` for :code:`--batch-commit`.
+    The mutation of every candidate is identified by the subtree in which it differs from :code:`original`,
+    candidates that touch overlapping subtrees are skipped.
+    First tries to apply all mutations at once. If :code:`is_valid` rejects the combination,
+    the mutations are added one by one on top of the first candidate and only kept if the result remains valid."""
+    edits = []
+    for cand in sorted(candidates, key = lambda c: c.counter):
+        path = semantics.find_difference(original, cand.exprs)
+        if path is None:
+            continue
+        if any(path[:len(p)] == p or p[:len(path)] == path for _, p in edits):
+            continue
+        edits.append((cand, path))
+    if len(edits) < 2:
+        return edits[0][0] if edits else candidates[0]
+
+    def combine(selected):
+        exprs = original
+        for cand, path in selected:
+            exprs = semantics.replace_subtree(exprs, path, semantics.get_subtree(cand.exprs, path))
+        if len(selected) == 1:
+            return selected[0][0]
+        name = 'batch of {}: {}'.format(len(selected), ', '.join(cand.simplification for cand, _ in selected))
+        return Candidate(min(cand.counter for cand, _ in selected), name, exprs)
+
+    res = combine(edits)
+    if is_valid(res.exprs):
+        return res
+    selected = edits[:1]
+    for edit in edits[1:]:
+        if is_valid(combine(selected + [edit]).exprs):
+            selected.append(edit)
+    return combine(selected)
+
+def write_candidate(exprs, out):
+    """Writes :code:`exprs` to the file object :code:`out` using :meth:`parser.write_smtlib` and flushes it.
+    Returns the key of the candidate for the cache, which is computed while writing."""
+    writer = cache.DigestWriter(out)
+    parser.write_smtlib(exprs, writer)
+    out.flush()
+    return writer.key()
+
+def render_worker_input(exprs):
+    """Renders :code:`exprs` for :meth:`checker.execute_worker`.
+    With :code:`--worker-mode push-pop`, the commands split off by :meth:`checker.split_header` are rendered separately.
+    Returns the rendered header and commands, and the key of the candidate."""
+    header = ''
+    if options.args().worker_mode == 'push-pop':
+        commands, exprs = checker.split_header(exprs)
+        header = '\n'.join(map(parser.render_expression, commands))
+    text = parser.render_smtlib(exprs)
+    return header, text, cache.digest(header + '\n' + text)
+
+def next_retry(timed_out):
+    """Selects the candidates to retry from :code:`timed_out`, a list of pairs of the timeout to retry with and the candidate.
+    Returns the smallest timeout, the candidates to retry with this timeout in the order they were generated and the remaining pairs."""
+    timeout = min(t for t, _ in timed_out)
+    candidates = sorted([c for t, c in timed_out if t == timeout], key = lambda c: c.counter)
+    checker.RETRIES += len(candidates)
+    logging.info('Retrying %d candidates that timed out with a timeout of %d seconds', len(candidates), timeout)
+    return timeout, candidates, [(t, c) for t, c in timed_out if t != timeout]
+
+def available_memory():
+    """Returns the memory (in bytes) that is available for new processes according to :code:`/proc/meminfo`,
+    or :code:`None` if it is unknown."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+class ConcurrencyController:
+    """Limits the number of concurrently running checks of :class:`Manager` for :code:`--adaptive-threads`.
+    The limit is recomputed regularly from the number of idle cores according to the load average,
+    and from the expected memory usage of a check (see :meth:`checker.get_check_memory`) compared to
+    the available memory and the global budget given by :code:`--memory-budget`.
+    The limit is at least one and at most :code:`max_threads`."""
+    def __init__(self, max_threads):
+        self.max_threads = max_threads
+        self.active = 0
+        self.allowed = max_threads
+        self.updated = None
+        self.interval = 0.5
+        self.cond = threading.Condition()
+
+    def compute_limit(self):
+        """Computes the current limit for the number of concurrent checks."""
+        limit = self.max_threads
+        try:
+            # the load caused by other processes
+            load = max(0.0, os.getloadavg()[0] - self.active)
+            limit = min(limit, int(os.cpu_count() - load + 0.5))
+        except OSError:
+            pass
+        memory = checker.get_check_memory()
+        if memory is not None and memory > 0:
+            if options.args().memory_budget != 0:
+                limit = min(limit, options.args().memory_budget * 1024 * 1024 // memory)
+            available = available_memory()
+            if available is not None:
+                # keep some memory for everything else
+                limit = min(limit, self.active + int(0.8 * available) // memory)
+        return max(1, min(self.max_threads, limit))
+
+    def acquire(self, stopped):
+        """Waits until another check may be started and registers it.
+        Returns :code:`False` without registering if :code:`stopped()` becomes true while waiting."""
+        with self.cond:
+            while not stopped():
+                if self.updated is None or time.time() - self.updated > self.interval:
+                    allowed = self.compute_limit()
+                    if allowed != self.allowed:
+                        logging.debug('Allowing %d concurrent checks', allowed)
+                    self.allowed = allowed
+                    self.updated = time.time()
+                if self.active < self.allowed:
+                    self.active += 1
+                    return True
+                self.cond.wait(timeout = self.interval)
+            return False
+
+    def release(self):
+        """Unregisters a check that was registered by :meth:`acquire`."""
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+
 class Manager:
     """Manages the asynchronous generation and checking of mutated inputs.
     One thread runs the :meth:`producer` method that fills a :class:`queue.Queue`
     while as many threads as given by the :code:`--max-threads` options run and evaluate the candidates from the queue.
     The :meth:`simplify` methods starts all threads and terminates them as soon as one valid simplication has been found.
+    With :code:`--batch-commit`, the checks that are still running are completed and all valid simplifications are merged.
+    Candidates that time out are retried with a larger timeout if no simplification was found, see :meth:`checker.retry_timeout`.
+    With :code:`--adaptive-threads`, a :class:`ConcurrencyController` decides how many of the threads may run checks at the same time.
     """
     def __init__(self):
         self.q = queue.Queue(maxsize = 20)
         self.stop_operation = False
         self.finished_generation = False
         self.result = None
+        self.results = []
         self.result_lock = threading.Lock()
+        self.running = checker.ProcessTracker()
+        self.timeout = None
+        self.timed_out = []
+        self.controller = None
 
     def __empty_queue(self):
         """Empty the queue."""
@@ -44,59 +201,107 @@ class Manager:
         except queue.Empty:
             pass
 
-
-    def producer(self, original, skip):
-        """Produces new mutated variants of the given input."""
-        original_size = semantics.node_count(original)
-        gen = mutator.MutationGenerator(skip)
-        for candidate in gen.generate_mutations(original):
-            if options.args().mode_aggressive:
-                if semantics.node_count(candidate[2]) > original_size * (1 - options.args().aggressiveness):
-                    continue
-            if options.args().mode_reduction_only:
-                if semantics.node_count(candidate[2]) >= original_size:
-                    continue
-            self.q.put(Candidate(candidate[0], candidate[1], copy.deepcopy(candidate[2])))
+    def producer(self, original, skip, candidates = None):
+        """Produces new mutated variants of the given input, or takes them from :code:`candidates` if given."""
+        if candidates is None:
+            candidates = generate_candidates(original, skip)
+        for candidate in candidates:
+            self.q.put(candidate)
             if self.stop_operation:
                 break
         self.finished_generation = True
 
+    def check(self, exprs, timeout):
+        """Renders :code:`exprs` and runs the command on it with the given :code:`timeout`,
+        unless the very same input has been checked before.
+        Returns the :class:`checker.ExecResult`, or :code:`None` if the check was cancelled because a simplification was found."""
+        if options.args().worker_mode is not None:
+            header, text, key = render_worker_input(exprs)
+            res = cache.lookup(key, timeout)
+            if res is None:
+                res = checker.execute_worker(options.args().cmd, header, text, self.running, timeout)
+                if res is not None:
+                    cache.store(key, res)
+            return res
+        inp = checker.acquire_input()
+        try:
+            # the candidate is streamed to the input file while computing its key
+            key = write_candidate(exprs, inp.open())
+            res = cache.lookup(key, timeout)
+            if res is not None:
+                return res
+            res = checker.execute(options.args().cmd, inp, self.running, timeout = timeout)
+        finally:
+            checker.release_input(inp)
+        if res is not None:
+            cache.store(key, res)
+        return res
+
     def consumer(self):
         """Takes candidates from the queue and checks whether their output matches the reference result."""
         while not self.stop_operation:
             try:
                 candidate = self.q.get(timeout = 0.25)
                 self.q.task_done()
-                try:
-                    with tempfile.NamedTemporaryFile('w', suffix = '.smt2') as tmp:
-                        tmp.write(parser.render_smtlib(candidate.exprs))
-                        tmp.flush()
-                        res = checker.execute(options.args().cmd, tmp.name)
-                except FileNotFoundError:
-                    logging.info('Removing the temporary file failed.')
-                if checker.matches_reference(res):
+                timeout = checker.get_timeout() if self.timeout is None else self.timeout
+                if self.controller is not None:
+                    if not self.controller.acquire(lambda: self.stop_operation):
+                        break
+                    try:
+                        res = self.check(candidate.exprs, timeout)
+                    finally:
+                        self.controller.release()
+                else:
+                    res = self.check(candidate.exprs, timeout)
+                if res is not None and res.timeout and checker.retry_timeout(timeout) is not None:
+                    with self.result_lock:
+                        self.timed_out.append((checker.retry_timeout(timeout), candidate))
+                    continue
+                accepted = res is not None and checker.matches_reference(res)
+                if res is not None:
+                    checker.record_runtime(res, accepted)
+                if accepted:
                     with self.result_lock:
+                        if self.timeout is not None:
+                            checker.RETRIES_ACCEPTED += 1
+                        self.results.append(candidate)
                         if self.result is None:
                             self.stop_operation = True
                             self.result = candidate
+                            if not options.args().batch_commit:
+                                # stop all other checks, their results are not needed anymore
+                                self.running.cancel()
             except queue.Empty:
                 if self.finished_generation:
                     break
         self.__empty_queue()
 
-    def simplify(self, original, skip = 0):
-        """Starts one producer thread and multiple consumer thread and then waits for a valid simplification."""
+    def simplify(self, original, skip = 0, candidates = None, timeout = None, timed_out = None):
+        """Starts one producer thread and multiple consumer thread and then waits for a valid simplification.
+        If :code:`candidates` are given, they are checked instead of the mutations of :code:`original`.
+        If :code:`timeout` is given, it is used instead of :meth:`checker.get_timeout`.
+        Candidates that time out are deferred as given by :meth:`checker.retry_timeout`, together with those from :code:`timed_out`.
+        If no simplification was found, the deferred candidates are retried with the smallest larger timeout."""
         assert self.q.empty()
         self.q = queue.Queue(maxsize = 20)
         self.stop_operation = False
         self.finished_generation = False
         self.result = None
+        self.results = []
+        self.running = checker.ProcessTracker()
+        self.timeout = timeout
+        self.timed_out = list(timed_out or [])
+        threads = options.args().max_threads
+        if options.args().adaptive_threads:
+            # the controller decides how many of the threads actually run checks
+            if self.controller is None:
+                self.controller = ConcurrencyController(threads)
         try:
             threads = [
-                threading.Thread(target = self.producer, name = 'producer', args = (original, skip))
+                threading.Thread(target = self.producer, name = 'producer', args = (original, skip, candidates))
             ] + [
                 threading.Thread(target = self.consumer, name = 'consumer-{}'.format(i + 1))
-                for i in range(options.args().max_threads)
+                for i in range(threads)
             ]
             for t in threads:
                 t.start()
@@ -107,8 +312,170 @@ class Manager:
             sys.stdout.write('\n')
             logging.warning('Stopping all computations.')
             self.stop_operation = True
+            self.running.cancel()
             self.__empty_queue()
             raise
 
         sys.stdout.write('\n')
+        if self.result is None and self.timed_out:
+            timeout, candidates, timed_out = next_retry(self.timed_out)
+            return self.simplify(original, candidates = candidates, timeout = timeout, timed_out = timed_out)
+        if len(self.results) > 1:
+            self.result = merge_candidates(original, self.results, self.__is_valid)
+        return self.result
+
+    def __is_valid(self, exprs):
+        """Checks whether :code:`exprs` is a valid simplification."""
+        res = self.check(exprs, options.args().timeout)
+        return res is not None and checker.matches_reference(res)
+
+class AsyncManager:
+    """Manages the generation and checking of mutated inputs based on :code:`asyncio`, as selected by :code:`--engine asyncio`.
+    The candidates are generated in an executor, at most as many checks as given by the :code:`--max-threads` option run concurrently
+    and all other checks are cancelled as soon as one valid simplification has been found.
+    With :code:`--batch-commit`, the checks that are still running are completed and all valid simplifications are merged.
+    As for :class:`Manager`, candidates that time out are retried with a larger timeout if no simplification was found.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        # the child watcher for subprocesses uses the current event loop
+        asyncio.set_event_loop(self.loop)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = 1)
+        self.worker_executor = None
+        self.tasks = set()
+        self.result = None
+        self.results = []
+        self.running = checker.ProcessTracker()
+        self.timeout = None
+        self.timed_out = []
+        self.error = None
+
+    async def check(self, exprs, timeout):
+        """Renders :code:`exprs` and runs the command on it with the given :code:`timeout`,
+        unless the very same input has been checked before.
+        Returns the :class:`checker.ExecResult`, or :code:`None` if the check was cancelled."""
+        if options.args().worker_mode is not None:
+            header, text, key = await self.loop.run_in_executor(self.executor, render_worker_input, exprs)
+            res = cache.lookup(key, timeout)
+            if res is None:
+                res = await self.loop.run_in_executor(self.worker_executor, checker.execute_worker,
+                                                      options.args().cmd, header, text, self.running, timeout)
+                if res is not None:
+                    cache.store(key, res)
+            return res
+        inp = checker.acquire_input()
+        try:
+            key = await self.loop.run_in_executor(self.executor, write_candidate, exprs, inp.open())
+            res = cache.lookup(key, timeout)
+            if res is not None:
+                return res
+            if options.args().cpu_time:
+                # the CPU time is only available if the process is waited for by checker.execute()
+                res = await self.loop.run_in_executor(self.worker_executor, functools.partial(checker.execute, timeout = timeout),
+                                                      options.args().cmd, inp, self.running)
+            else:
+                res = await checker.execute_async(options.args().cmd, inp, timeout = timeout)
+        finally:
+            checker.release_input(inp)
+        if res is not None:
+            cache.store(key, res)
+        return res
+
+    async def __check_candidate(self, candidate, semaphore):
+        """Checks a single candidate and stores it as result if it is valid."""
+        try:
+            timeout = checker.get_timeout() if self.timeout is None else self.timeout
+            res = await self.check(candidate.exprs, timeout)
+            if res is not None and res.timeout and checker.retry_timeout(timeout) is not None:
+                self.timed_out.append((checker.retry_timeout(timeout), candidate))
+                return
+            accepted = res is not None and checker.matches_reference(res)
+            if res is not None:
+                checker.record_runtime(res, accepted)
+            if accepted:
+                if self.timeout is not None:
+                    checker.RETRIES_ACCEPTED += 1
+                self.results.append(candidate)
+                if self.result is None:
+                    self.result = candidate
+        finally:
+            semaphore.release()
+
+    def __task_done(self, task):
+        """Forgets a finished check and keeps its exception, which is raised by :meth:`__simplify`."""
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None and self.error is None:
+            self.error = task.exception()
+
+    async def __cancel(self):
+        """Cancels all running checks and waits for them to terminate."""
+        self.running.cancel()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions = True)
+
+    async def __simplify(self, original, skip, candidates):
+        """Starts checks for all candidates until one valid simplification has been found."""
+        semaphore = asyncio.Semaphore(options.args().max_threads)
+        if candidates is None:
+            candidates = generate_candidates(original, skip)
+        candidates = iter(candidates)
+        try:
+            while self.result is None and self.error is None:
+                await semaphore.acquire()
+                if self.result is not None or self.error is not None:
+                    break
+                candidate = await self.loop.run_in_executor(self.executor, next, candidates, None)
+                if candidate is None:
+                    break
+                task = self.loop.create_task(self.__check_candidate(candidate, semaphore))
+                self.tasks.add(task)
+                task.add_done_callback(self.__task_done)
+            while self.tasks and self.error is None and (self.result is None or options.args().batch_commit):
+                await asyncio.wait(list(self.tasks), return_when = asyncio.FIRST_COMPLETED)
+            if self.error is not None:
+                # a check failed, do not mistake it for a rejected candidate
+                raise self.error
+        finally:
+            await self.__cancel()
+
+    def simplify(self, original, skip = 0, candidates = None, timeout = None, timed_out = None):
+        """Runs the event loop until a valid simplification has been found or all candidates have been checked.
+        If :code:`candidates` are given, they are checked instead of the mutations of :code:`original`.
+        If :code:`timeout` is given, it is used instead of :meth:`checker.get_timeout`.
+        Candidates that time out are deferred as given by :meth:`checker.retry_timeout`, together with those from :code:`timed_out`.
+        If no simplification was found, the deferred candidates are retried with the smallest larger timeout."""
+        self.tasks = set()
+        self.result = None
+        self.results = []
+        self.running = checker.ProcessTracker()
+        self.timeout = timeout
+        self.timed_out = list(timed_out or [])
+        self.error = None
+        if self.worker_executor is None:
+            self.worker_executor = concurrent.futures.ThreadPoolExecutor(max_workers = options.args().max_threads)
+        main = self.loop.create_task(self.__simplify(original, skip, candidates))
+        try:
+            self.loop.run_until_complete(main)
+        except KeyboardInterrupt:
+            sys.stdout.write('\n')
+            logging.warning('Stopping all computations.')
+            main.cancel()
+            try:
+                self.loop.run_until_complete(main)
+            except asyncio.CancelledError:
+                pass
+            raise
+
+        sys.stdout.write('\n')
+        if self.result is None and self.timed_out:
+            timeout, candidates, timed_out = next_retry(self.timed_out)
+            return self.simplify(original, candidates = candidates, timeout = timeout, timed_out = timed_out)
+        if len(self.results) > 1:
+            self.result = merge_candidates(original, self.results, self.__is_valid)
         return self.result
+
+    def __is_valid(self, exprs):
+        """Checks whether :code:`exprs` is a valid simplification."""
+        res = self.loop.run_until_complete(self.check(exprs, options.args().timeout))
+        return res is not None and checker.matches_reference(res)
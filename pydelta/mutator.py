@@ -1,18 +1,35 @@
 import collections
-import copy
 import progressbar
 
 from . import mutator_options
 from . import semantics
 
-Mutation = collections.namedtuple('Mutation', ['nodeid', 'name', 'localm', 'globalm'])
+Mutation = collections.namedtuple('Mutation', ['nodeid', 'name', 'localm', 'globalm', 'delta'])
 
 enabled_mutators = []
+__mutators_by_head = {}
 
 def collect_mutators(args):
     """Initializes the list of all active mutators."""
     global enabled_mutators
+    global __mutators_by_head
     enabled_mutators = mutator_options.collect_mutators(args)
+    __mutators_by_head = {}
+
+def get_mutators(node):
+    """Returns the active mutators that may apply to :code:`node` as tuples :code:`(mutator, filter, mutations, global_mutations)`,
+    where methods a mutator does not implement are :code:`None`.
+    Mutators that declare :code:`heads` are only used for nodes whose head (see :meth:`semantics.get_head`) is listed there.
+    The result is computed once for every head and keeps the order of :code:`enabled_mutators`."""
+    head = semantics.get_head(node)
+    res = __mutators_by_head.get(head, None)
+    if res is None:
+        res = [
+            (m, getattr(m, 'filter', None), getattr(m, 'mutations', None), getattr(m, 'global_mutations', None))
+            for m in enabled_mutators if not hasattr(m, 'heads') or head in m.heads
+        ]
+        __mutators_by_head[head] = res
+    return res
 
 class MutationGenerator:
     def __init__(self, skip):
@@ -21,40 +38,53 @@ class MutationGenerator:
 
     def __mutate_node(self, linput, ginput):
         """Apply all active mutators to the given node.
-        Returns a list of all possible mutations as tuples :code:`(name, local, global)`
+        Yields all possible mutations as tuples :code:`(name, local, global, delta)`
         where :code:`local` is a modification of the current node and :code:`global` is
-        a modification of the whole input and one of those is always :code:`None`."""
-        res = []
-        for m in enabled_mutators:
+        a modification of the whole input and one of those is always :code:`None`.
+        For local mutations, :code:`delta` is the change of the number of nodes.
+        Global mutations are generated lazily, as some mutators produce many large ones."""
+        for m, filt, mutations, global_mutations in get_mutators(linput):
             try:
-                if hasattr(m, 'filter') and not m.filter(linput):
+                if filt is not None and not filt(linput):
                     continue
-                if hasattr(m, 'mutations'):
-                    res = res + list(map(lambda x: Mutation(self.__node_count, str(m), x, None), m.mutations(linput)))
-                if hasattr(m, 'global_mutations'):
-                    res = res + list(map(lambda x: Mutation(self.__node_count, "(global) " + str(m), None, x), m.global_mutations(linput, ginput)))
-            except:
-                pass
-        return res
+                local = []
+                if mutations is not None:
+                    local = list(mutations(linput))
+                glob = iter([])
+                if global_mutations is not None:
+                    glob = iter(global_mutations(linput, ginput))
+            except Exception:
+                continue
+            for x in local:
+                yield Mutation(self.__node_count, str(m), x, None, semantics.node_count(x) - semantics.node_count(linput))
+            while True:
+                try:
+                    x = next(glob)
+                except StopIteration:
+                    break
+                yield Mutation(self.__node_count, "(global) " + str(m), None, x, None)
 
     def __generate_mutations(self, linput, ginput, prg):
-        """Generate mutations from the given original, updating the progress bar."""
+        """Generate mutations from the given original, updating the progress bar.
+        Nodes are never modified in place: a mutation only copies the nodes on the path to the mutated node
+        and shares all other subtrees with the original."""
         prg.update(prg.currval + 1)
         if self.__node_count >= self.__node_skip:
             yield from self.__mutate_node(linput, ginput)
         self.__node_count += 1
         if isinstance(linput, list):
             for i, o in enumerate(linput):
-                cand = copy.copy(linput)
                 for mutated in self.__generate_mutations(o, ginput, prg):
                     if mutated.localm is not None:
+                        cand = linput.copy()
                         cand[i] = mutated.localm
-                        yield Mutation(mutated.nodeid, mutated.name, cand, mutated.globalm)
+                        yield Mutation(mutated.nodeid, mutated.name, cand, mutated.globalm, mutated.delta)
                     if mutated.globalm is not None:
                         yield mutated
 
     def generate_mutations(self, original):
-        """A generator that produces all possible mutations from the given original."""
+        """A generator that produces all possible mutations from the given original
+        as tuples :code:`(nodeid, name, exprs, size)` where :code:`size` is the number of nodes of :code:`exprs`."""
         semantics.collect_information(original)
         s = semantics.node_count(original)
         widgets = [progressbar.Bar(), ' ', progressbar.Counter(), ' / ', str(s)]
@@ -63,6 +93,6 @@ class MutationGenerator:
         prg.update_interval = 1
         for mutated in self.__generate_mutations(original, original, prg):
             if mutated.localm is not None:
-                yield (mutated.nodeid, mutated.name, mutated.localm)
+                yield (mutated.nodeid, mutated.name, mutated.localm, s + mutated.delta)
             if mutated.globalm is not None:
-                yield (mutated.nodeid, mutated.name, mutated.globalm)
+                yield (mutated.nodeid, mutated.name, mutated.globalm, semantics.node_count(mutated.globalm))
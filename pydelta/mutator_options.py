@@ -36,6 +36,12 @@ class BeautifyAction(argparse.Action):
         setattr(namespace, 'mutator_simplify_symbol_names', True)
         setattr(namespace, 'wrap_lines', True)
 
+class HDDAction(argparse.Action):
+    """Mode that performs hierarchical delta debugging before applying the mutators."""
+    def __call__(self, parser, namespace, values, option_string = None):
+        setattr(namespace, 'mode_hdd', True)
+        setattr(namespace, 'mutator_top_level_binary_reduction', False)
+
 class LetEliminationAction(argparse.Action):
     """Mode that only checks for let eliminations."""
     def __call__(self, parser, namespace, values, option_string = None):
@@ -71,6 +77,7 @@ def collect_mutator_modes(argparser):
     argparser.add_argument('--aggressiveness', metavar = 'perc', type = float, default = 0.01,
                            help = 'percentage of the input a mutators needs to remove')
     argparser.add_argument('--mode-beautify', default = False, nargs = 0, action = BeautifyAction, help = 'enables beautification mutators')
+    argparser.add_argument('--mode-hdd', default = False, nargs = 0, action = HDDAction, help = 'use hierarchical delta debugging first')
     argparser.add_argument('--mode-let-elimination', default = False, nargs = 0, action = LetEliminationAction, help = 'only eliminate let binders')
     argparser.add_argument('--mode-reduction-only', default = False, nargs = 0, action = ReductionOnlyAction, help = 'only allow reducing mutations')
     argparser.add_argument('--mode-top-level-only', default = False, nargs = 0, action = TopLevelOnlyAction, help = 'use top level binary reduction')
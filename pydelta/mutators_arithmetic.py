@@ -4,13 +4,16 @@ from .semantics import *
 NAME = 'arithmetic'
 MUTATORS = ['arith-constants', 'arith-negate-relations', 'split-nary-relations', 'strengthen-relations']
 
+ARITHMETIC_RELATIONS = ['=', '<', '>', '>=', '<=', '!=', '<>']
+
 def is_arithmetic_relation(node):
     if not has_name(node):
         return False
-    return get_name(node) in ['=', '<', '>', '>=', '<=', '!=', '<>']
+    return get_name(node) in ARITHMETIC_RELATIONS
 
 class ArithmeticSimplifyConstant:
     """Replace a constant by a simpler version (smaller or fewer decimal places)."""
+    heads = [LEAF]
     def filter(self, node):
         return is_arithmetic_constant(node) and float(node) not in [0, 1]
     def mutations(self, node):
@@ -26,6 +29,7 @@ class ArithmeticSimplifyConstant:
 
 class ArithmeticNegateRelations:
     """Replace a negation around a relation by the inverse relation."""
+    heads = ['not']
     def filter(self, node):
         return is_not(node) and is_arithmetic_relation(node[1])
     def mutations(self, node):
@@ -38,6 +42,7 @@ class ArithmeticNegateRelations:
 
 class ArithmeticSplitNaryRelations:
     """Split n-ary relations using transitivity."""
+    heads = ARITHMETIC_RELATIONS
     def filter(self, node):
         return is_arithmetic_relation(node) and len(node) > 3
     def mutations(self, node):
@@ -48,8 +53,7 @@ class ArithmeticSplitNaryRelations:
 
 class ArithmeticStrengthenRelations:
     """Replace a relation by a stronger relation."""
-    def filter(self, node):
-        return is_arithmetic_relation(node)
+    heads = ARITHMETIC_RELATIONS
     def mutations(self, node):
         negator = { '<': ['='], '>': ['='], '<=': ['<', '='], '>=': ['>', '='] }
         if node[0] in negator:
@@ -33,6 +33,7 @@ def possible_bitvector_widths(node):
 
 class BVConcatToZeroExtend:
     """Replace a :code:`concat` with zero by :code:`zero_extend`."""
+    heads = ['concat']
     def filter(self, node):
         if not has_name(node) or get_name(node) != 'concat':
             return False
@@ -48,6 +49,7 @@ class BVConcatToZeroExtend:
 
 class BVElimBVComp:
     """Replace bvcomp by a regular equality."""
+    heads = ['=']
     def filter(self, node):
         return has_name(node) and get_name(node) == '=' and is_bitvector_constant(node[1]) and has_name(node[2]) and get_name(node[2]) == 'bvcomp'
     def mutations(self, node):
@@ -85,6 +87,7 @@ class BVExtractConstants:
 
 class BVOneZeroITE:
     """Replace an :code:`ite` with :code:`bv1`/:code:`bv0` cases by :code:`bvcomp`."""
+    heads = ['ite']
     def filter(self, node):
         if not is_ite(node):
             return False
@@ -102,18 +105,22 @@ class BVOneZeroITE:
 
 class BVSimplifyConstant:
     """Replace a constant by a simpler version (smaller value)."""
+    heads = [LEAF, '_']
     def filter(self, node):
         return is_bitvector_constant(node) and get_bitvector_constant_value(node)[0] not in [0, 1]
     def mutations(self, node):
         val, width = get_bitvector_constant_value(node)
         return ['#b{{:0>{}b}}'.format(width).format(v) for v in [val // 2, val // 10]]
     def global_mutations(self, linput, ginput):
+        if is_leaf(linput):
+            return [ substitute(ginput, {linput: rep}) for rep in self.mutations(linput) ]
         return [ substitute_repr(ginput, {repr(linput): rep}) for rep in self.mutations(linput) ]
     def __str__(self):
         return 'simplify bitvector constant'
 
 class BVTransformToBool:
     """Turn BV constructs into Boolean constructs."""
+    heads = ['=']
     def filter(self, node):
         return has_name(node) and get_name(node) == '=' and is_bitvector_constant(node[1])
     def mutations(self, node):
@@ -9,6 +9,7 @@ def is_quantifier(node):
 
 class DeMorgan:
     """Uses de Morgans rules to push negations inside."""
+    heads = ['not']
     def filter(self, node):
         return is_not(node) and has_name(node[1])
     def mutations(self, node):
@@ -24,6 +25,7 @@ class DeMorgan:
 
 class DoubleNegation:
     """Elimination double negations."""
+    heads = ['not']
     def filter(self, node):
         return is_not(node) and is_not(node[1])
     def mutations(self, node):
@@ -33,6 +35,7 @@ class DoubleNegation:
 
 class EliminateFalseEquality:
     """Replaces an equality with :code:`false` by a negation."""
+    heads = ['=']
     def filter(self, node):
         return not is_leaf(node) and len(node) == 3 and has_name(node) and get_name(node) == '=' and node[1] == 'false'
     def mutations(self, node):
@@ -42,6 +45,7 @@ class EliminateFalseEquality:
 
 class EliminateImplications:
     """Replaces implications by disjunctions."""
+    heads = ['=>']
     def filter(self, node):
         return has_name(node) and get_name(node) == '=>' and len(node) == 3
     def mutations(self, node):
@@ -51,6 +55,7 @@ class EliminateImplications:
 
 class NegatedQuantifiers:
     """Pushes negation inside quantifiers."""
+    heads = ['not']
     def filter(self, node):
         return is_not(node) and is_quantifier(node[1])
     def mutations(self, node):
@@ -64,8 +69,7 @@ class NegatedQuantifiers:
 
 class XORRemoveConstants:
     """Eliminates constant children from :code:`xor`."""
-    def filter(self, node):
-        return has_name(node) and get_name(node) == 'xor'
+    heads = ['xor']
     def mutations(self, node):
         res = []
         if 'false' in node:
@@ -79,6 +83,7 @@ class XORRemoveConstants:
 
 class XOREliminateBinary:
     """Eliminates binary :code:`xor` by :code:`distinct`."""
+    heads = ['xor']
     def filter(self, node):
         return has_name(node) and get_name(node) == 'xor' and len(node) == 3
     def mutations(self, node):
@@ -1,3 +1,5 @@
+import bisect
+
 from . import options
 from .semantics import *
 
@@ -55,9 +57,10 @@ class ReplaceByVariable:
         variables = get_variables_with_type(ret_type)
         if is_leaf(node):
             if options.args().replace_by_variable_mode == 'inc':
-                return [v for v in variables if v > node]
-            return [v for v in variables if v < node]
-        return [v for v in variables if node_count(v) < node_count(node)]
+                return variables[bisect.bisect_right(variables, node):]
+            return variables[:bisect.bisect_left(variables, node)]
+        # variables are leaves, hence smaller than any other node
+        return list(variables)
     def __str__(self):
         return 'substitute by existing variable'
 
@@ -84,22 +87,51 @@ class SubstituteChildren:
         return 'substitute with child'
 
 class TopLevelBinaryReduction:
-    """Performs binary reduction on the top level node. Essentially mimics line based reduction."""
+    """Performs binary reduction on the top level node. Essentially mimics line based reduction.
+    Works like ddmin: the commands are split into chunks and the complement of every chunk is generated lazily.
+    The chunks are only made smaller once all chunks of the current size have been generated,
+    and the position is kept across simplification rounds."""
+    def __init__(self):
+        self.__granularity = 2
+        self.__position = 0
+        self.__previous = None
+        self.__generated = []
+    def __resume(self, ginput):
+        """Adapts the position if :code:`ginput` is not the input of the last call anymore.
+        If one of the previously generated complements was accepted, continue with the chunk that now takes its place.
+        Otherwise, continue with the first chunk generated in the last call."""
+        if self.__previous is None or self.__previous is ginput or not self.__generated:
+            return
+        prev = self.__previous
+        self.__granularity, self.__position = self.__generated[0][:2]
+        removed = len(prev) - len(ginput)
+        for den, num, start, end in self.__generated:
+            if end - start == removed and ginput[:start] == prev[:start] and ginput[start:] == prev[end:]:
+                self.__granularity, self.__position = den, num
+                break
+    def __complements(self, ginput):
+        """Generates the complements of all chunks, starting from the current position."""
+        while self.__granularity < len(ginput):
+            den = self.__granularity
+            while self.__position < den:
+                num = self.__position
+                self.__position += 1
+                start = len(ginput) * num // den
+                end = len(ginput) * (num + 1) // den
+                self.__generated.append((den, num, start, end))
+                yield ginput[:start] + ginput[end:]
+            self.__granularity *= 2
+            self.__position = 0
+        # all chunks have been generated, start over with the next round
+        self.__granularity = 2
+        self.__position = 0
     def global_mutations(self, linput, ginput):
-        if linput != ginput:
+        if linput is not ginput:
             return []
-        # generate all sublists as generated by binary-search in bfs order
-        # let den be the denominator of the list length (the tree level)
-        # let num be the numerator within the current tree level
-        res = []
-        den = 2
-        while den < len(ginput):
-            for num in range(0, den):
-                start = int(num/den * len(ginput))
-                end = int((num+1)/den * len(ginput))
-                res.append(ginput[:start] + ginput[end:])
-            den *= 2
-        return res
+        self.__resume(ginput)
+        self.__previous = ginput
+        self.__generated = []
+        return self.__complements(ginput)
     def __str__(self):
         return 'binary reduction'
 
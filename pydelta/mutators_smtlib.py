@@ -11,8 +11,7 @@ MUTATORS = [
 
 class CheckSatAssuming:
     """Replaces a :code:`check-sat-assuming` by a regular :code:`check-sat`."""
-    def filter(self, node):
-        return has_name(node) and get_name(node) == 'check-sat-assuming'
+    heads = ['check-sat-assuming']
     def mutations(self, node):
         return [['check-sat']]
     def __str__(self):
@@ -20,8 +19,7 @@ class CheckSatAssuming:
 
 class EliminateDistinct:
     """Replaces distinct by a negated equality."""
-    def filter(self, node):
-        return has_name(node) and get_name(node) == 'distinct'
+    heads = ['distinct']
     def mutations(self, node):
         return [['not', ['='] + node[1:]]]
     def __str__(self):
@@ -38,8 +36,7 @@ class InlineDefinedFuns:
 
 class LetElimination:
     """Substitutes a :code:`let` expression with its body."""
-    def filter(self, node):
-        return is_let(node)
+    heads = ['let']
     def mutations(self, node):
         return [node[2]]
     def __str__(self):
@@ -47,8 +44,7 @@ class LetElimination:
 
 class LetSubstitution:
     """Substitutes a variable bound by a :code:`let` binder into the nested term."""
-    def filter(self, node):
-        return is_let(node)
+    heads = ['let']
     def mutations(self, node):
         res = []
         for var in node[1]:
@@ -91,8 +87,7 @@ class PushPopRemoval:
 
 class SimplifyLogic:
     """Replaces the logic specified in :code:`(check-logic ...)` by a simpler one."""
-    def filter(self, node):
-        return has_name(node) and get_name(node) == 'set-logic'
+    heads = ['set-logic']
     def mutations(self, node):
         logic = node[1]
         cands = []
@@ -106,6 +101,7 @@ class SimplifyLogic:
 
 class SimplifyQuotedSymbols:
     """Turns a quoted symbol into a simple symbol."""
+    heads = [LEAF]
     def filter(self, node):
         return is_quoted_symbol(node) and re.match('\\|[a-zA-Z0-9~!@$%^&*_+=<>.?/-]+\\|', node) is not None
     def global_mutations(self, linput, ginput):
@@ -115,8 +111,7 @@ class SimplifyQuotedSymbols:
 
 class SimplifySymbolNames:
     """Simplify variable names."""
-    def filter(self, node):
-        return has_name(node) and get_name(node) in ['declare-const', 'declare-datatypes', 'declare-fun', 'declare-sort', 'exists', 'forall']
+    heads = ['declare-const', 'declare-datatypes', 'declare-fun', 'declare-sort', 'exists', 'forall']
     def global_mutations(self, linput, ginput):
         if get_name(linput) == 'declare-datatypes':
             res = []
@@ -6,6 +6,7 @@ MUTATORS = ['str-constants']
 
 class StringSimplifyConstant:
     """Replace a string constant by a shorter version."""
+    heads = [LEAF]
     def filter(self, node):
         return is_string_constant(node) and node != '""'
     def mutations(self, node):
@@ -0,0 +1,46 @@
+import sys
+import weakref
+
+class Node(list):
+    """An interned, immutable compound node as created by :meth:`intern`.
+    Interned nodes are hash-consed: structurally equal interned nodes are the very same object,
+    hence equality and hashing take constant time. Additionally, the size of the subtree is stored.
+    Slicing, copying or concatenating yields regular lists, hence all code that works on plain nodes also works on interned nodes."""
+    __slots__ = ('hash', 'size', '__weakref__')
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, Node):
+            return False
+        return list.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self.hash
+
+__NODES = weakref.WeakValueDictionary()
+
+def intern(node):
+    """Returns the interned version of :code:`node`.
+    Leaf nodes are interned via :meth:`sys.intern`, subtrees that are already interned are reused."""
+    if isinstance(node, Node):
+        return node
+    if not isinstance(node, list):
+        return sys.intern(node)
+    children = [intern(n) for n in node]
+    # children are interned, hence their identities determine the node
+    key = tuple(map(id, children))
+    res = __NODES.get(key)
+    if res is None:
+        res = Node(children)
+        res.hash = hash(key)
+        res.size = 1 + sum(c.size if isinstance(c, Node) else 1 for c in children)
+        __NODES[key] = res
+    return res
+
+def intern_exprs(exprs):
+    """Interns all nodes within a sequence of nodes."""
+    return [intern(e) for e in exprs]
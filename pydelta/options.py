@@ -12,8 +12,8 @@ class CustomFormatter(argparse.ArgumentDefaultsHelpFormatter, argparse.HelpForma
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs, max_help_position = 35)
 
-def parse_options():
-    """Configures the commandline parse and then parse the commandline options."""
+def parse_options(argv = None):
+    """Configures the commandline parse and then parse the commandline options, or :code:`argv` if given."""
     usage = "{} [<options>] <inputfile> <cmd> [<cmd options>]".format(sys.argv[0])
 
     argp = argparsemod.ModularArgumentParser(usage = usage, formatter_class = CustomFormatter, modular_help_groups = ['mutator help'])
@@ -29,11 +29,46 @@ def parse_options():
 
     argp_checking = argp.add_argument_group('checking arguments')
     argp_checking.add_argument('--parse-only', action = 'store_true', default = False, help = 'only parse the input file')
+    argp_checking.add_argument('--parse-processes', type = int, metavar = 'n', default = 1,
+                               help = 'number of processes to parse large input files; #processors+n if n<=0')
+    argp_checking.add_argument('--intern-nodes', action = 'store_true', default = False,
+                               help = 'share structurally equal subtrees of the input to save memory and speed up comparisons')
     argp_checking.add_argument('--run-unchecked', action = 'store_true', default = False, help = 'apply mutations without checking them')
     argp_checking.add_argument('--max-threads', type = int, metavar = 'n', default = '-2',
                                help = 'number of threads to use; #processors+n if n<=0')
+    argp_checking.add_argument('--adaptive-threads', action = 'store_true', default = False,
+                               help = 'adjust the number of concurrent checks to the load and the available memory, up to --max-threads')
+    argp_checking.add_argument('--memory-budget', type = int, metavar = 'megabytes', default = 0,
+                               help = 'memory that all concurrent checks may use together with --adaptive-threads; 0 for no limit')
     argp_checking.add_argument('--timeout', type = int, metavar = 'seconds', default = 0, help = 'timeout for individual checks')
+    argp_checking.add_argument('--adaptive-timeout', action = 'store_true', default = False,
+                               help = 'tighten the timeout based on the runtimes of recent checks, up to --timeout')
+    argp_checking.add_argument('--retry-timeouts', type = float, metavar = 'factor', default = 0,
+                               help = 'retry candidates that timed out with factor times the timeout if no other simplification is found; '
+                                      '0 disables retries')
+    argp_checking.add_argument('--cpu-time', action = 'store_true', default = False,
+                               help = 'measure the runtime of checks as CPU time and enforce the timeout as CPU time limit')
     argp_checking.add_argument('--memout', type = int, metavar = 'megabytes', default = 0, help = 'memout for individual checks')
+    argp_checking.add_argument('--max-output', type = int, metavar = 'kilobytes', default = 10240,
+                               help = 'maximum size of the captured output of every stream of a check; 0 for no limit')
+    argp_checking.add_argument('--engine', choices = ['threads', 'asyncio'], default = 'threads',
+                               help = 'engine that runs the checks concurrently')
+    argp_checking.add_argument('--worker-mode', choices = ['reset', 'push-pop'], default = None,
+                               help = 'keep one solver process per thread and pass candidates via stdin, '
+                                      'separated by (reset) or (push 1)/(pop 1)')
+    argp_checking.add_argument('--input-mode', choices = ['tempfile', 'file', 'memfd', 'stdin'], default = 'tempfile',
+                               help = 'how candidates are passed to the command: a new temporary file for every check, '
+                                      'a reused file per thread in --input-dir, a reused memfd as /dev/fd/n, or via stdin')
+    argp_checking.add_argument('--input-dir', metavar = 'directory', default = None,
+                               help = 'directory for the reused files of --input-mode; defaults to /dev/shm if available')
+    argp_checking.add_argument('--batch-commit', action = 'store_true', default = False,
+                               help = 'finish running checks after a simplification was found and merge all simplifications')
+    argp_checking.add_argument('--cache-size', type = int, metavar = 'n', default = 10000,
+                               help = 'number of check results to remember; 0 disables caching')
+    argp_checking.add_argument('--cache-dir', metavar = 'directory', default = None,
+                               help = 'directory for a persistent cache of check results that can be shared between runs')
+    argp_checking.add_argument('--cache-dir-size', type = int, metavar = 'megabytes', default = 1024,
+                               help = 'maximum size of the persistent cache')
     argp_checking.add_argument('--skip', type = int, metavar = 'n', default = 0, help = 'initially skip n candidates')
 
     argp_output = argp.add_argument_group('output arguments')
@@ -49,7 +84,7 @@ def parse_options():
 
     mutator_options.collect_mutator_options(argp)
 
-    return argp.parse_args()
+    return argp.parse_args(argv)
 
 __PARSED_ARGS = None
 
@@ -60,6 +95,12 @@ def args():
         __PARSED_ARGS = parse_options()
     return __PARSED_ARGS
 
+def set_args(argv):
+    """Parses :code:`argv` instead of the commandline and returns the options that are used by :meth:`args` from now on."""
+    global __PARSED_ARGS
+    __PARSED_ARGS = parse_options(argv)
+    return __PARSED_ARGS
+
 def add_mutator_argument(argparser, name, default, help_msg):
     dest = 'mutator_{}'.format(name.replace('-', '_'))
     grp = argparser.add_mutually_exclusive_group()
@@ -1,24 +1,48 @@
+import concurrent.futures
+import gc
+import io
+import itertools
 import logging
+import mmap
+import os
 import re
-import sys
-import textwrap
 
 from . import options
+from . import semantics
+
+__TOKENS = [
+    ('COMMENT', ';[^\n]*'),
+    ('LPAREN', '\\('),
+    ('RPAREN', '\\)'),
+    ('STRINGLIT', '"[^"]*"'),
+    ('QUOTEDSYM', '\\|[^\\|]*\\|'),
+    ('SYMBOL', '[:a-zA-Z0-9~!@$#%\\^&*_+=<>.?/-]+'),
+    ('SPACE', '\\s+'),
+    ('MISMATCH', '.'),
+]
+__TOKEN_RE = re.compile('|'.join(['(?P<{}>{})'.format(tok[0], tok[1]) for tok in __TOKENS]))
+__TOKEN_PATTERN = '|'.join(tok[1] for tok in __TOKENS if tok[0] in ['LPAREN', 'RPAREN', 'STRINGLIT', 'QUOTEDSYM', 'SYMBOL'])
+# finds all tokens at once: whitespace is skipped by findall(), comments yield empty tokens and
+# characters that do not start any token are returned as single-character tokens, just like MISMATCH
+__BULK_TOKEN_RE = re.compile(';[^\n]*|(' + __TOKEN_PATTERN + '|\\S)')
+__VALID_TOKEN_RE = re.compile(__TOKEN_PATTERN)
+__CHUNK_SIZE = 16 * 1024 * 1024
+# only used on binary data by split_commands()
+__SPECIAL_RE = re.compile(b'"[^"]*"|\\|[^\\|]*\\||;[^\n]*')
+__PAREN_RE = re.compile(b'[()]')
+__SCAN_BLOCK_SIZE = 64 * 1024
+
+# renderings of subtrees of the current input, see render_cached_expression()
+__RENDERED = {}
+__RENDERED_BASE = None
+__RENDERED_CHARS = 0
+__RENDER_CACHE_FACTOR = 4
+# number of pieces that write_smtlib() collects before writing them
+__WRITE_BATCH_SIZE = 4096
 
 def lexer(text):
-    __tokens = [
-        ('COMMENT', ';[^\n]*'),
-        ('LPAREN', '\\('),
-        ('RPAREN', '\\)'),
-        ('STRINGLIT', '"[^"]*"'),
-        ('QUOTEDSYM', '\\|[^\\|]*\\|'),
-        ('SYMBOL', '[:a-zA-Z0-9~!@$#%\\^&*_+=<>.?/-]+'),
-        ('SPACE', '\\s+'),
-        ('MISMATCH', '.'),
-    ]
-    __token_re = re.compile('|'.join(['(?P<{}>{})'.format(tok[0], tok[1]) for tok in __tokens]))
-
-    for m in __token_re.finditer(text):
+    """A generator that yields all tokens of :code:`text`."""
+    for m in __TOKEN_RE.finditer(text):
         kind = m.lastgroup
         if kind in ['SPACE', 'COMMENT']:
             continue
@@ -42,21 +66,182 @@ def parse_expression(tokens):
             stack[-1].append(tok)
     return None
 
-def parse_smtlib(text):
-    """Parses an SMT-LIB input to a sequence of nodes."""
-    token_stream = lexer(text)
+def __chunk_end(data, pos, newline):
+    """Returns the end of the chunk of :code:`data` that starts before :code:`pos`: right after the next newline."""
+    if pos >= len(data):
+        return len(data)
+    end = data.find(newline, pos)
+    if end == -1:
+        return len(data)
+    return end + 1
+
+def __build_nodes(tokens, stack, exprs):
+    """Builds nodes from a sequence of tokens and appends all completed top-level nodes to :code:`exprs`.
+    :code:`stack` holds the nodes that are not yet completed and is kept across calls."""
+    for tok in tokens:
+        if tok == '(':
+            stack.append([])
+        elif tok == ')':
+            cur = stack.pop()
+            if stack:
+                stack[-1].append(cur)
+            else:
+                exprs.append(cur)
+        else:
+            stack[-1].append(tok)
+
+def __replay_chunk(chunk, depth):
+    """Runs :meth:`lexer` on :code:`chunk` until the token that can not be parsed at the given nesting :code:`depth`,
+    such that the same warnings are issued as when parsing from a token stream."""
+    for tok in lexer(chunk):
+        if tok == '(':
+            depth += 1
+        elif depth == 0:
+            return
+        elif tok == ')':
+            depth -= 1
+
+def __parse_chunks(data, decode = None, chunk_size = __CHUNK_SIZE):
+    """Parses :code:`data` in chunks of about :code:`chunk_size` characters that end at newlines, tokenizing every chunk at once.
+    Chunks are extended if a string literal or quoted symbol may span beyond their end.
+    If :code:`data` is binary, :code:`decode` is used to turn every chunk into a string.
+    Equal tokens are represented by the same string object."""
     exprs = []
-    while True:
-        try:
-            exprs.append(parse_expression(token_stream))
-        except StopIteration:
-            break
-        except RuntimeError as err:
-            if isinstance(err.__cause__, StopIteration):
-                break
-            raise
+    stack = []
+    symbols = {}
+    newline = b'\n' if decode is not None else '\n'
+    size = chunk_size
+    pos = 0
+    gc_enabled = gc.isenabled()
+    # the garbage collector is triggered by every few hundred new nodes, but can not free any of them
+    gc.disable()
+    try:
+        while pos < len(data):
+            end = __chunk_end(data, pos + size, newline)
+            chunk = data[pos:end]
+            if decode is not None:
+                chunk = decode(chunk)
+            tokens = __BULK_TOKEN_RE.findall(chunk)
+            unique = set(tokens)
+            if end < len(data) and ('"' in unique or '|' in unique):
+                size *= 2
+                continue
+            size = chunk_size
+            pos = end
+            depth = len(stack)
+            try:
+                __build_nodes(filter(None, map(symbols.setdefault, tokens, tokens)), stack, exprs)
+            except IndexError:
+                __replay_chunk(chunk, depth)
+                raise
+            if any(tok != '' and __VALID_TOKEN_RE.fullmatch(tok) is None for tok in unique):
+                # issue the warnings in the order of lexer()
+                for _ in lexer(chunk):
+                    pass
+    finally:
+        if gc_enabled:
+            gc.enable()
     return exprs
 
+def parse_smtlib(text, chunk_size = __CHUNK_SIZE):
+    """Parses an SMT-LIB input to a sequence of nodes, tokenizing chunks of about :code:`chunk_size` characters at once.
+    Incomplete nodes at the end of the input are ignored."""
+    return __parse_chunks(text, chunk_size = chunk_size)
+
+def __count(data, char, start, end):
+    """Counts :code:`char` in :code:`data[start:end]`. Works blockwise, as memory mapped files have no :code:`count()`."""
+    if end - start <= __CHUNK_SIZE:
+        return data[start:end].count(char)
+    return sum(data[pos:min(pos + __CHUNK_SIZE, end)].count(char) for pos in range(start, end, __CHUNK_SIZE))
+
+def __find_top_level(data, pos, end, depth):
+    """Searches :code:`data[pos:end]`, which contains no string literals, quoted symbols or comments,
+    for the first position where all parentheses are closed, given that :code:`depth` parentheses are open at :code:`pos`.
+    Returns this position or :code:`None`, and the number of open parentheses at this position or :code:`end`.
+    The position is always right after a closing parenthesis, hence never within a top-level atom or a multi-byte character.
+    Parentheses are counted blockwise and only blocks that may close all parentheses are scanned one by one."""
+    while pos < end:
+        if depth <= 0:
+            # skip to the next parenthesis, as pos may be within a top-level atom
+            m = __PAREN_RE.search(data, pos, end)
+            if m is None:
+                return None, depth
+            depth += 1 if m.group() == b'(' else -1
+            pos = m.end()
+            if depth <= 0:
+                return pos, depth
+            continue
+        block = min(pos + __SCAN_BLOCK_SIZE, end)
+        closing = __count(data, b')', pos, block)
+        if closing < depth:
+            depth += __count(data, b'(', pos, block) - closing
+            pos = block
+            continue
+        for m in __PAREN_RE.finditer(data, pos, block):
+            depth += 1 if m.group() == b'(' else -1
+            if depth <= 0:
+                return m.end(), depth
+        pos = block
+    return None, depth
+
+def split_commands(data, parts):
+    """Returns positions that split the binary :code:`data` into (up to) :code:`parts` parts of about the same size.
+    Every position is between two top-level commands, ignoring parentheses in string literals, quoted symbols and comments."""
+    res = []
+    depth = 0
+    pos = 0
+    target = len(data) // parts
+    for special in itertools.chain(__SPECIAL_RE.finditer(data), [None]):
+        gap_end = len(data) if special is None else special.start()
+        while len(res) < parts - 1:
+            if target >= gap_end:
+                depth += __count(data, b'(', pos, gap_end) - __count(data, b')', pos, gap_end)
+                break
+            if pos < target:
+                depth += __count(data, b'(', pos, target) - __count(data, b')', pos, target)
+                pos = target
+            found, depth = __find_top_level(data, pos, gap_end, depth)
+            if found is None:
+                break
+            if 0 < found < len(data):
+                res.append(found)
+            pos = found
+            target = max(found + 1, len(data) * (len(res) + 1) // parts)
+        if len(res) == parts - 1 or special is None:
+            break
+        pos = special.end()
+    return res
+
+def __parse_part(filename, start, end, chunk_size):
+    """Parses the part :code:`[start, end)` of an SMT-LIB file, used by the worker processes of :meth:`parse_smtlib_file`."""
+    with open(filename, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            return __parse_chunks(data[start:end], __decode_chunk, chunk_size)
+
+def __decode_chunk(chunk):
+    """Decodes a chunk of an input file, translating line endings like :code:`open()` does."""
+    res = chunk.decode('utf8')
+    if '\r' in res:
+        res = res.replace('\r\n', '\n').replace('\r', '\n')
+    return res
+
+def parse_smtlib_file(filename, processes = 1, chunk_size = __CHUNK_SIZE):
+    """Parses an SMT-LIB file to a sequence of nodes like :meth:`parse_smtlib`.
+    The file is mapped into memory instead of being read as a whole.
+    If :code:`processes` is larger than one, large files are split between top-level commands
+    and the parts are parsed in parallel. Warnings may then be issued for parts after a parse error."""
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            if processes <= 1 or len(data) <= chunk_size:
+                return __parse_chunks(data, __decode_chunk, chunk_size)
+            bounds = [0] + split_commands(data, 4 * processes) + [len(data)]
+    logging.debug('Parsing %d parts of the input with %d processes', len(bounds) - 1, processes)
+    with concurrent.futures.ProcessPoolExecutor(max_workers = processes) as pool:
+        parts = pool.map(__parse_part, [filename] * (len(bounds) - 1), bounds[:-1], bounds[1:], [chunk_size] * (len(bounds) - 1))
+        return [expr for part in parts for expr in part]
+
 def render_expression(expr):
     """Renders a node to a string."""
     if isinstance(expr, list):
@@ -65,27 +250,153 @@ def render_expression(expr):
 
 def render_pretty_expression(expr, indent = ''):
     """Renders a node to a string in a pretty way."""
-    if isinstance(expr, list):
-        if expr != [] and expr[0] in ['declare-const', 'declare-fun']:
-            return render_expression(expr)
-        if all(map(lambda e: not isinstance(e, list), expr)):
-            return '(' + ' '.join(expr) + ')'
-        res = '(' + render_pretty_expression(expr[0]) + '\n'
+    pieces = []
+    write_pretty_expression(expr, pieces.append, indent)
+    return ''.join(pieces)
+
+def write_pretty_expression(expr, write, indent = ''):
+    """Writes a node in a pretty way like :meth:`render_pretty_expression`, passing the pieces to the function :code:`write`."""
+    if not isinstance(expr, list):
+        write(expr)
+    elif expr != [] and expr[0] in ['declare-const', 'declare-fun']:
+        write(render_expression(expr))
+    elif all(map(lambda e: not isinstance(e, list), expr)):
+        write('(' + ' '.join(expr) + ')')
+    else:
+        write('(')
+        write_pretty_expression(expr[0], write)
+        write('\n')
         for e in expr[1:]:
-            res += indent + '\t' + render_pretty_expression(e, indent + '\t') + '\n'
-        res += indent + ')'
-        return res
-    return expr
+            write(indent + '\t')
+            write_pretty_expression(e, write, indent + '\t')
+            write('\n')
+        write(indent + ')')
+
+def iterate_words(expr):
+    """A generator that yields the words of :meth:`render_expression`, that is the parts of the rendering that are separated by spaces.
+    Spaces within string literals and quoted symbols never separate words."""
+    if not isinstance(expr, list):
+        yield expr
+        return
+    if not expr:
+        yield '()'
+        return
+    prefix = '('
+    word = None
+    for child in expr:
+        for w in iterate_words(child):
+            if word is not None:
+                yield word
+            word = prefix + w
+            prefix = ''
+    yield word + ')'
+
+def write_wrapped_expression(expr, write, width = 78, indent = '  '):
+    """Writes a node such that lines are at most :code:`width` characters long, passing the pieces to the function :code:`write`.
+    Lines are only broken between words (see :meth:`iterate_words`) and continuation lines are indented by :code:`indent`,
+    hence words longer than a line are never split."""
+    length = None
+    for word in iterate_words(expr):
+        if length is None:
+            write(word)
+            length = len(word)
+        elif length + 1 + len(word) <= width:
+            write(' ' + word)
+            length += 1 + len(word)
+        else:
+            write('\n' + indent + word)
+            length = len(indent) + len(word)
+
+def __get_render_cache():
+    """Returns the cache for :meth:`render_cached_expression`,
+    which is reset whenever :meth:`semantics.collect_information` is called on a new input."""
+    global __RENDERED
+    global __RENDERED_BASE
+    global __RENDERED_CHARS
+    base = semantics.get_annotated_input()
+    if base is not __RENDERED_BASE:
+        __RENDERED = {}
+        __RENDERED_BASE = base
+        __RENDERED_CHARS = 0
+    return __RENDERED
+
+def render_cached_expression(expr, cache):
+    """Renders a node to a string like :meth:`render_expression`.
+    The renderings of subtrees of the current input (see :meth:`semantics.is_annotated`) are taken from :code:`cache`,
+    hence only the nodes that were changed are rendered again.
+    Only the largest such subtrees are added to the cache, their children are not."""
+    pieces = []
+    write_cached_expression(expr, pieces.append, cache)
+    return ''.join(pieces)
+
+def write_cached_expression(expr, write, cache):
+    """Writes a node like :meth:`render_cached_expression`, passing the pieces to the function :code:`write`.
+    Only the nodes that were changed are traversed, the renderings of all other subtrees are written as a whole.
+    Returns the number of characters written."""
+    global __RENDERED_CHARS
+    if not isinstance(expr, list):
+        write(expr)
+        return len(expr)
+    if semantics.is_annotated(expr):
+        entry = cache.get(id(expr))
+        # the node is stored as well, such that its id can not be reused
+        if entry is not None and entry[0] is expr:
+            res = entry[1]
+        else:
+            res = render_expression(expr)
+            cache[id(expr)] = (expr, res)
+            __RENDERED_CHARS += len(res)
+        write(res)
+        return len(res)
+    write('(')
+    count = len(expr) + 1
+    for i, e in enumerate(expr):
+        if i > 0:
+            write(' ')
+        count += write_cached_expression(e, write, cache)
+    write(')')
+    return count + (len(expr) == 0)
+
+def write_smtlib(exprs, out):
+    """Writes a sequence of nodes to the file object :code:`out`, exactly as :meth:`render_smtlib` renders them.
+    The pieces are collected and written in batches, hence the rendering of the whole input is never held in memory,
+    not even of a single large command.
+    Unless pretty-printing or wrapping lines, subtrees of the current input are rendered using a cache."""
+    global __RENDERED_BASE
+    pieces = []
+    append = pieces.append
+
+    def write(piece):
+        append(piece)
+        if len(pieces) > __WRITE_BATCH_SIZE:
+            out.write(''.join(pieces))
+            pieces.clear()
+
+    cache = None
+    if not options.args().pretty_print and not options.args().wrap_lines:
+        cache = __get_render_cache()
+    count = 0
+    for i, expr in enumerate(exprs):
+        if i > 0:
+            write('\n')
+        if options.args().pretty_print:
+            write_pretty_expression(expr, write)
+        elif options.args().wrap_lines:
+            write_wrapped_expression(expr, write)
+        else:
+            count += write_cached_expression(expr, write, cache)
+    out.write(''.join(pieces))
+    if cache is not None and __RENDERED_CHARS > __RENDER_CACHE_FACTOR * count:
+        # the cache has grown much larger than the input, start over with the next call
+        __RENDERED_BASE = None
 
 def render_smtlib(exprs):
-    """Renders a sequence of nodes to a string."""
-    if options.args().pretty_print:
-        return '\n'.join(map(render_pretty_expression, exprs))
-    res = map(render_expression, exprs)
-    if options.args().wrap_lines:
-        res = [line for r in res for line in textwrap.wrap(r, width = 78, subsequent_indent = '  ')]
-    return '\n'.join(res)
+    """Renders a sequence of nodes to a string, see :meth:`write_smtlib`."""
+    out = io.StringIO()
+    write_smtlib(exprs, out)
+    return out.getvalue()
 
 def write_smtlib_to_file(exprs, filename):
     """Writes a sequence of nodes to a file."""
-    open(filename, 'w').write(render_smtlib(exprs))
+    with open(filename, 'w') as f:
+        write_smtlib(exprs, f)
@@ -1,7 +1,19 @@
 import re
 
+from . import nodes
+
 __defined_functions = {}
 __defined_variables = {}
+__variables_by_type = {}
+__node_sizes = {}
+__node_types = {}
+__node_parents = {}
+__symbol_parents = {}
+__containing_nodes = {}
+__annotated_exprs = None
+
+# head of all leaf nodes, see get_head()
+LEAF = object()
 
 def is_leaf(node):
     """Checks whether the :code:`node` is a leaf node."""
@@ -22,6 +34,15 @@ def get_name(node):
     assert has_name(node)
     return node[0]
 
+def get_head(node):
+    """Gets the head of the :code:`node`: its name if it has one,
+    :code:`LEAF` for leaf nodes and :code:`None` otherwise."""
+    if is_leaf(node):
+        return LEAF
+    if has_name(node):
+        return node[0]
+    return None
+
 def is_quoted_symbol(node):
     """Checks whether the :code:`node` is a quoted symbol."""
     return is_leaf(node) and node[0] == '|' and node[-1] == '|'
@@ -78,10 +99,50 @@ def is_nary(node):
     ]
 
 def node_count(exprs):
-    """Counts the number of nodes within :code:`exprs`."""
-    if not is_leaf(exprs):
-        return 1 + sum(map(node_count, exprs))
-    return 1
+    """Counts the number of nodes within :code:`exprs`.
+    The sizes of all subtrees of the input given to :meth:`collect_information` are cached,
+    hence only nodes that were created afterwards are actually traversed."""
+    if isinstance(exprs, nodes.Node):
+        return exprs.size
+    if is_leaf(exprs):
+        return 1
+    res = __node_sizes.get(id(exprs))
+    if res is None:
+        res = 1 + sum(map(node_count, exprs))
+    return res
+
+def __annotate_nodes(node, previous):
+    """Computes the sizes, return types and bit-vector widths of all subtrees of :code:`node` bottom-up, indexed by their :code:`id`.
+    Types that are given in :code:`previous` are reused.
+    Additionally, the parents of all subtrees and leaf symbols are recorded."""
+    if is_leaf(node):
+        return 1
+    res = 1
+    for n in node:
+        res += __annotate_nodes(n, previous)
+        if is_leaf(n):
+            __symbol_parents.setdefault(n, []).append(node)
+        else:
+            __node_parents.setdefault(id(n), []).append(node)
+    key = id(node)
+    __node_sizes[key] = res
+    if key in previous:
+        __node_types[key] = previous[key]
+    else:
+        try:
+            __node_types[key] = (get_return_type(node), get_bitvector_width(node))
+        except (AssertionError, IndexError, TypeError, ValueError):
+            # the node is malformed, leave it to get_return_type() and get_bitvector_width() to fail again
+            pass
+    return res
+
+def is_annotated(node):
+    """Checks whether :code:`node` is a compound subtree of the input given to :meth:`collect_information`."""
+    return not is_leaf(node) and id(node) in __node_sizes
+
+def get_annotated_input():
+    """Returns the input given to :meth:`collect_information`."""
+    return __annotated_exprs
 
 def iterate_nodes(expr):
     """A generator that performs an pre-order iteration over all nodes."""
@@ -90,21 +151,83 @@ def iterate_nodes(expr):
         for e in expr:
             yield from iterate_nodes(e)
 
+def __get_containing_nodes(symbol):
+    """Returns the ids of all subtrees of the input given to :meth:`collect_information` that contain the leaf :code:`symbol`.
+    They are found by following the parents upwards from all occurrences of :code:`symbol`."""
+    res = __containing_nodes.get(symbol, None)
+    if res is None:
+        res = set()
+        queue = list(__symbol_parents.get(symbol, []))
+        while queue:
+            node = queue.pop()
+            if id(node) not in res:
+                res.add(id(node))
+                queue.extend(__node_parents.get(id(node), []))
+        __containing_nodes[symbol] = res
+    return res
+
 def contains(node, sub):
-    """Checks whether :code:`node` contains the node :code:`sub`."""
+    """Checks whether :code:`node` contains the node :code:`sub`.
+    Takes constant time if :code:`sub` is a leaf and :code:`node` is part of the input given to :meth:`collect_information`."""
     if node == sub:
         return True
     if is_leaf(node):
         return False
+    if is_leaf(sub) and id(node) in __node_sizes:
+        return id(node) in __get_containing_nodes(sub)
     return any(map(lambda n: contains(n, sub), node))
 
+def find_difference(node, other):
+    """Returns the path (as list of child indices) to the smallest subtree of :code:`node` that contains all differences to :code:`other`.
+    Returns :code:`None` if both are equal."""
+    if node == other:
+        return None
+    path = []
+    while not is_leaf(node) and not is_leaf(other) and len(node) == len(other):
+        diffs = [i for i in range(len(node)) if node[i] != other[i]]
+        if len(diffs) != 1:
+            break
+        path.append(diffs[0])
+        node = node[diffs[0]]
+        other = other[diffs[0]]
+    return path
+
+def get_subtree(node, path):
+    """Returns the subtree of :code:`node` at the given :code:`path`."""
+    for i in path:
+        node = node[i]
+    return node
+
+def replace_subtree(node, path, repl):
+    """Returns a copy of :code:`node` where the subtree at :code:`path` is replaced by :code:`repl`.
+    Only the nodes along :code:`path` are copied, all other subtrees are shared with :code:`node`."""
+    if not path:
+        return repl
+    res = node.copy()
+    res[path[0]] = replace_subtree(node[path[0]], path[1:], repl)
+    return res
+
 def substitute(node, repl):
     """Performs substitution recursively within :code:`node`.
-    :code:`repl` specifies the substitutions as a dictionary where keys can only be leaf nodes."""
+    :code:`repl` specifies the substitutions as a dictionary where keys can only be leaf nodes.
+    Within the input given to :meth:`collect_information`, only subtrees that contain a key are rebuilt, all others are shared."""
     if is_leaf(node):
         return repl.get(node, node)
+    if id(node) in __node_sizes:
+        affected = set()
+        for key in repl:
+            affected.update(__get_containing_nodes(key))
+        return __substitute_affected(node, repl, affected)
     return list(map(lambda n: substitute(n, repl), node))
 
+def __substitute_affected(node, repl, affected):
+    """Performs substitution within :code:`node`, but only descends into subtrees whose :code:`id` is in :code:`affected`."""
+    if is_leaf(node):
+        return repl.get(node, node)
+    if id(node) not in affected:
+        return node
+    return [__substitute_affected(n, repl, affected) for n in node]
+
 def substitute_repr(node, repl):
     """Performs substitution recursively within :code:`node`.
     :code:`repl` specifies the substitutions as a dictionary.
@@ -204,6 +327,8 @@ def is_bitvector_rotate(node):
     return len(node[0]) == 3 and node[0][1] in ['rotate_left', 'rotate_right']
 
 def get_bitvector_width(node):
+    if not is_leaf(node) and id(node) in __node_types:
+        return __node_types[id(node)][1]
     if is_bitvector_constant(node):
         if is_leaf(node):
             if node.startswith('#b'):
@@ -256,7 +381,14 @@ def get_constants(const_type):
 
 def get_return_type(node):
     """Tries to figure out the return type of the given node.
+    Uses the type cached by :meth:`collect_information` if possible.
     Returns :code:`None` if it can not be inferred."""
+    if not is_leaf(node) and id(node) in __node_types:
+        return __node_types[id(node)][0]
+    return __infer_return_type(node)
+
+def __infer_return_type(node):
+    """Infers the return type of the given node from its children, see :meth:`get_return_type`."""
     if has_type(node):
         return get_type(node)
     if is_boolean_constant(node):
@@ -332,17 +464,24 @@ def get_type(node):
     return __defined_variables[node]
 
 def get_variables_with_type(var_type):
-    """Returns all variables with the type :code:`var_type`."""
-    return [
-        v for v in __defined_variables
-        if __defined_variables[v] == var_type
-    ]
+    """Returns all variables with the type :code:`var_type` as a sorted list, which must not be modified."""
+    return __variables_by_type.get(repr(var_type), [])
 
 
 def collect_information(exprs):
-    """Initialize global lookups: defined functions and types."""
+    """Initialize global lookups: defined functions and types.
+    Afterwards, all nodes are annotated with their sizes, return types and bit-vector widths.
+    The types of subtrees that are shared with the previous input are reused if the declared variables did not change."""
     global __defined_functions
     global __defined_variables
+    global __variables_by_type
+    global __node_sizes
+    global __node_types
+    global __node_parents
+    global __symbol_parents
+    global __containing_nodes
+    global __annotated_exprs
+    previous_variables = __defined_variables
     __defined_functions = {}
     __defined_variables = {}
 
@@ -370,3 +509,20 @@ def collect_information(exprs):
                 node[4],
                 {node[2][i][0]: args[i] for i in range(len(args))}
             )
+
+    __variables_by_type = {}
+    for var, var_type in __defined_variables.items():
+        __variables_by_type.setdefault(repr(var_type), []).append(var)
+    for variables in __variables_by_type.values():
+        variables.sort()
+
+    # the previous input is kept alive until here, hence the ids in __node_types still refer to its subtrees
+    previous_types = __node_types if __defined_variables == previous_variables else {}
+    __node_sizes = {}
+    __node_types = {}
+    __node_parents = {}
+    __symbol_parents = {}
+    __containing_nodes = {}
+    __annotate_nodes(exprs, previous_types)
+    # keep exprs alive, such that the ids of all subtrees remain valid
+    __annotated_exprs = exprs
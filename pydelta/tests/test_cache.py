@@ -0,0 +1,43 @@
+import os
+
+from .. import cache
+from .. import checker
+from .. import options
+
+def test_lookup_timeout():
+    options.set_args(['input.smt2', 'solver'])
+    key = cache.digest('(check-sat)')
+    cache.store(key, checker.ExecResult(0, '', '', 1.0, True))
+    hits = cache.HITS
+    assert cache.lookup(key, 2.0) is None
+    assert cache.HITS == hits
+    assert cache.lookup(key, 1.0).timeout
+    assert cache.HITS == hits + 1
+
+def test_digest_options():
+    options.set_args(['input.smt2', 'solver'])
+    key = cache.digest('(check-sat)')
+    cache.store(key, checker.ExecResult(0, 'sat', '', 1.0, False))
+    assert cache.lookup(key) is not None
+    for argv in [['--memout', '100'], ['--cpu-time'], ['--ignore-output'], ['--max-output', '1']]:
+        options.set_args(argv + ['input.smt2', 'solver'])
+        assert cache.digest('(check-sat)') != key
+        assert cache.lookup(cache.digest('(check-sat)')) is None
+    options.set_args(['--timeout', '10', 'input.smt2', 'solver'])
+    assert cache.digest('(check-sat)') == key
+
+def test_store_timeout(tmp_path):
+    options.set_args(['--cache-size', '0', '--cache-dir', str(tmp_path), 'input.smt2', 'solver'])
+    key = cache.digest('(assert false)')
+    cache.store(key, checker.ExecResult(0, 'unsat', '', 3.0, False))
+    assert os.path.exists(tmp_path / key[:2] / (key[2:] + '.json'))
+    assert cache.lookup(key, 2) is None
+    assert cache.lookup(key, 5).stdout == 'unsat'
+
+def test_evict_store(tmp_path):
+    options.set_args(['--cache-size', '0', '--cache-dir', str(tmp_path), '--cache-dir-size', '1', 'input.smt2', 'solver'])
+    cache.evict_store()
+    for i in range(1000):
+        cache.store(cache.digest('(assert x{})'.format(i)), checker.ExecResult(0, 'sat', '', 0.1, False))
+    usage = sum(f.stat().st_blocks * 512 for f in tmp_path.glob('*/*.json'))
+    assert 0 < usage <= 1024 * 1024
@@ -0,0 +1,152 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from .. import checker
+from .. import options
+
+WORKER_SOLVER = '''#!{}
+import sys
+channel = sys.stdout
+logic = False
+asserted = []
+for line in sys.stdin:
+    line = line.strip()
+    if line.startswith('(set-option :regular-output-channel'):
+        channel = sys.stderr if 'stderr' in line else sys.stdout
+    elif line.startswith('(set-logic'):
+        if logic:
+            print('(error "set-logic not allowed")')
+        logic = True
+    elif line in ['(push 1)', '(pop 1)', '(reset)']:
+        asserted = []
+        logic = logic and line != '(reset)'
+    elif line.startswith('(assert'):
+        asserted.append(line)
+    elif line.startswith('(echo'):
+        print(line[7:-2], file = channel)
+    elif line == '(check-sat)':
+        print('checking', file = sys.stderr)
+        print('unsat' if any('false' in a for a in asserted) else 'sat')
+    sys.stdout.flush()
+    sys.stderr.flush()
+'''
+
+SLOW_SOLVER = '''#!{}
+import sys
+import time
+text = open(sys.argv[1]).read()
+print('unsat' if 'false' in text else 'sat', flush = True)
+if 'slow' in text:
+    time.sleep(60)
+'''
+
+CPU_SOLVER = '''#!{}
+import sys
+import time
+text = open(sys.argv[1]).read()
+while 'spin' in text:
+    pass
+time.sleep(1)
+print('sat', flush = True)
+if 'early' in text:
+    time.sleep(60)
+'''
+
+MEMORY_SOLVER = '''#!{}
+import time
+data = b'x' * (100 * 1024 * 1024)
+print('sat', flush = True)
+time.sleep(60)
+'''
+
+def write_solver(tmp_path, code):
+    filename = tmp_path / 'solver.py'
+    filename.write_text(code.format(sys.executable))
+    os.chmod(filename, 0o755)
+    return str(filename)
+
+def test_worker(tmp_path):
+    solver = write_solver(tmp_path, WORKER_SOLVER)
+    for mode in ['reset', 'push-pop']:
+        options.set_args(['--worker-mode', mode, 'input.smt2', solver])
+        try:
+            for i in range(20):
+                text = '(assert {})\n(check-sat)'.format('false' if i % 2 else 'true')
+                res = checker.execute_worker([solver], '(set-logic QF_UF)', text)
+                assert res == checker.ExecResult(0, 'unsat' if i % 2 else 'sat', 'checking', res.runtime, False)
+        finally:
+            checker.stop_workers()
+
+def test_tracker_cancel():
+    tracker = checker.ProcessTracker()
+    proc = subprocess.Popen(['sleep', '60'], start_new_session = True)
+    assert tracker.add(proc)
+    tracker.cancel()
+    assert proc.wait(timeout = 10) == -signal.SIGTERM
+    assert tracker.remove(proc)
+    proc = subprocess.Popen(['sleep', '60'], start_new_session = True)
+    assert not tracker.add(proc)
+    assert proc.wait(timeout = 10) != 0
+
+def run_candidate(cmd, text):
+    """Executes :code:`cmd` on :code:`text` like a candidate and returns the result and the wall clock time."""
+    inp = checker.acquire_input()
+    try:
+        out = inp.open()
+        out.write(text)
+        out.flush()
+        start = time.time()
+        return checker.execute(cmd, inp), time.time() - start
+    finally:
+        checker.release_input(inp)
+
+def test_decide_early(tmp_path):
+    solver = write_solver(tmp_path, SLOW_SOLVER)
+    inputfile = tmp_path / 'input.smt2'
+    inputfile.write_text('(assert false)')
+    # a match is known once the pattern was found, a mismatch once the output deviates from the reference
+    cases = [(['--match-out', 'unsat', '--ignore-exitcode'], '(assert false) slow', True), ([], '(assert true) slow', False)]
+    for args, text, matches in cases:
+        options.set_args(args + ['--timeout', '100', str(inputfile), solver])
+        assert checker.compute_reference([solver], str(inputfile))
+        res, duration = run_candidate([solver], text)
+        assert duration < 30 and checker.matches_reference(res) == matches
+    checker.close_inputs()
+
+def test_cpu_time(tmp_path):
+    solver = write_solver(tmp_path, CPU_SOLVER)
+    inputfile = tmp_path / 'input.smt2'
+    inputfile.write_text('(check-sat)')
+    options.set_args(['--cpu-time', '--timeout', '2', str(inputfile), solver])
+    assert checker.compute_reference([solver], str(inputfile))
+    res, duration = run_candidate([solver], '(check-sat)')
+    assert not res.timeout and res.runtime < 0.5 <= duration
+    res, duration = run_candidate([solver], '(check-sat) spin')
+    assert res.timeout and duration < 30
+    # the CPU time is also measured if the check is stopped once its result is known
+    options.set_args(['--cpu-time', '--timeout', '2', '--match-out', 'sat', '--ignore-exitcode', str(inputfile), solver])
+    res, duration = run_candidate([solver], '(check-sat) early')
+    assert checker.matches_reference(res) and res.runtime < 0.5 <= duration < 30
+    checker.close_inputs()
+
+def test_adaptive_timeout():
+    options.set_args(['--timeout', '100', 'input.smt2', 'solver'])
+    checker.record_runtime(checker.ExecResult(0, '', '', 3.2, False), True)
+    assert checker.get_timeout() == 100
+    options.set_args(['--adaptive-timeout', '--timeout', '100', 'input.smt2', 'solver'])
+    assert checker.get_timeout() == checker.automatic_timeout(3.2) == 8
+    assert checker.retry_timeout(8) == 100
+    assert checker.retry_timeout(100) is None
+
+def test_check_memory(tmp_path):
+    solver = write_solver(tmp_path, MEMORY_SOLVER)
+    options.set_args(['--adaptive-threads', '--match-out', 'sat', '--ignore-exitcode', '--timeout', '100', 'input.smt2', solver])
+    # the peak of the solver is smaller than the one of pydelta, which is included in the resource usage of the child
+    ballast = b'x' * (300 * 1024 * 1024)
+    res, duration = run_candidate([solver], '(check-sat)')
+    assert res.stdout == 'sat' and duration < 30 and len(ballast) > 0
+    assert checker.get_check_memory() >= 100 * 1024 * 1024
+    checker.close_inputs()
@@ -0,0 +1,27 @@
+from .. import hdd
+
+def test_nodes_at_level():
+    exprs = [['assert', ['and', 'x', 'y']], ['check-sat']]
+    assert hdd.nodes_at_level(exprs, 0) == [[0], [1]]
+    assert hdd.nodes_at_level(exprs, 1) == [[0, 1]]
+    assert hdd.nodes_at_level(exprs, 2) == [[0, 1, 1], [0, 1, 2]]
+    assert hdd.nodes_at_level(exprs, 3) == []
+
+def test_remove_nodes():
+    exprs = [['assert', ['and', 'x', 'y']], ['assert', ['or', 'x', 'y']]]
+    assert hdd.remove_nodes(exprs, [[0, 1, 1], [1, 1, 2]]) == [['assert', ['and', 'y']], ['assert', ['or', 'x']]]
+    assert hdd.remove_nodes(exprs, [[1]]) == [['assert', ['and', 'x', 'y']]]
+
+class FirstMatchManager:
+    """Accepts the first candidate that still contains :code:`false`."""
+    def simplify(self, original, candidates):
+        for c in candidates:
+            if 'false' in str(c.exprs):
+                return c
+        return None
+
+def test_heads_are_kept():
+    exprs = [['declare-const', 'x', 'Bool'], ['assert', ['and', ['not', 'x'], ['or', 'x', 'false']]], ['check-sat']]
+    for simp in hdd.hierarchical_reduction(FirstMatchManager(), exprs):
+        exprs = simp.exprs
+    assert exprs == [['assert', ['and', ['or', 'false']]]]
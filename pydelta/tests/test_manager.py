@@ -0,0 +1,9 @@
+from .. import checker
+from .. import manager
+from .. import options
+
+def test_concurrency_limit():
+    options.set_args(['--adaptive-threads', '--memory-budget', '3072', 'input.smt2', 'solver'])
+    checker.record_memory(1024 ** 3)
+    assert 1 <= manager.ConcurrencyController(8).compute_limit() <= 3
+    assert manager.ConcurrencyController(1).compute_limit() == 1
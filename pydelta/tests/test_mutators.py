@@ -0,0 +1,18 @@
+from .. import mutators_core
+
+def test_top_level_binary_reduction():
+    m = mutators_core.TopLevelBinaryReduction()
+    exprs = list(range(8))
+    res = list(m.global_mutations(exprs, exprs))
+    assert len(res) == 2 + 4
+    assert res[0] == [4, 5, 6, 7]
+    assert res[2] == [2, 3, 4, 5, 6, 7]
+
+def test_top_level_binary_reduction_resume():
+    m = mutators_core.TopLevelBinaryReduction()
+    exprs = list(range(16))
+    gen = m.global_mutations(exprs, exprs)
+    cands = [next(gen) for _ in range(5)]
+    # accepting the second chunk of granularity four continues there
+    exprs = cands[3]
+    assert next(m.global_mutations(exprs, exprs)) == [0, 1, 2, 10, 11, 12, 13, 14, 15]
@@ -0,0 +1,14 @@
+from .. import nodes
+from .. import semantics
+
+def test_intern():
+    a = nodes.intern(['assert', ['and', 'x', ['not', 'x']]])
+    b = nodes.intern(['assert', ['and', 'x', ['not', 'x']]])
+    assert a is b
+    assert a[1][1] is a[1][2][1]
+    assert a.size == semantics.node_count(['assert', ['and', 'x', ['not', 'x']]]) == 8
+    assert a == ['assert', ['and', 'x', ['not', 'x']]]
+    assert ['assert', ['and', 'x', ['not', 'x']]] == a
+    assert a != nodes.intern(['assert', 'x'])
+    assert a[1] != ['and', 'x']
+    assert type(a.copy()) is list
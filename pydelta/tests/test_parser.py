@@ -1,4 +1,72 @@
+import io
+import pytest
+
+from .. import options
 from .. import parser
+from .. import semantics
 
 def test_basic():
     assert parser.parse_smtlib('(reset)') == [['reset']]
+
+def test_tokens():
+    text = '(assert (= |a (b| "c ; d")) ; (comment\n(check-sat)'
+    assert parser.parse_smtlib(text) == [['assert', ['=', '|a (b|', '"c ; d"']], ['check-sat']]
+    assert parser.parse_smtlib('(a b) (c') == [['a', 'b']]
+
+def test_chunks(tmp_path):
+    text = '(assert |a\nb|)\n(set-info :source "x\ny\n")\n(check-sat)\n'
+    filename = tmp_path / 'input.smt2'
+    filename.write_text(text)
+    assert parser.parse_smtlib(text, chunk_size = 1) == [['assert', '|a\nb|'], ['set-info', ':source', '"x\ny\n"'], ['check-sat']]
+    assert parser.parse_smtlib_file(str(filename), chunk_size = 1) == parser.parse_smtlib(text)
+
+def test_split_commands():
+    data = b'(set-info :x "a)\n(b") ; c)\n(assert (and x\n(y)))\n(check-sat)\n'
+    bounds = parser.split_commands(data, 8)
+    assert bounds == sorted(set(bounds)) and len(bounds) > 1
+    parts = [data[a:b].decode() for a, b in zip([0] + bounds, bounds + [len(data)])]
+    assert [e for p in parts for e in parser.parse_smtlib(p)] == parser.parse_smtlib(data.decode())
+
+def test_render_cached():
+    exprs = parser.parse_smtlib('(assert (and (> x 0) (< y 1)))(check-sat)')
+    semantics.collect_information(exprs)
+    cache = {}
+    cand = [['assert', ['and', exprs[0][1][1], 'true']], exprs[1]]
+    assert parser.render_cached_expression(cand[0], cache) == '(assert (and (> x 0) true))'
+    assert cache[id(exprs[0][1][1])] == (exprs[0][1][1], '(> x 0)')
+    assert parser.render_cached_expression(exprs[0], cache) == parser.render_expression(exprs[0])
+
+def test_write_wrapped():
+    expr = parser.parse_smtlib('(assert (f-g |a b| "c  d" () (h x)))')[0]
+    assert list(parser.iterate_words(expr)) == ['(assert', '(f-g', '|a b|', '"c  d"', '()', '(h', 'x)))']
+    pieces = []
+    parser.write_wrapped_expression(expr, pieces.append, width = 16)
+    assert ''.join(pieces) == '(assert (f-g\n  |a b| "c  d"\n  () (h x)))'
+
+def test_write_pretty():
+    expr = parser.parse_smtlib('(assert (and x (not y)))')[0]
+    pieces = []
+    parser.write_pretty_expression(expr, pieces.append)
+    assert ''.join(pieces) == parser.render_pretty_expression(expr) == '(assert\n\t(and\n\t\tx\n\t\t(not y)\n\t)\n)'
+
+def test_write_batches():
+    options.set_args(['--pretty-print', 'input.smt2', 'solver'])
+    exprs = [['assert', ['and'] + [['not', 'x{}'.format(i)] for i in range(10000)]]]
+    out = io.StringIO()
+    writes = []
+    out.write = lambda text: writes.append(text) or io.StringIO.write(out, text)
+    parser.write_smtlib(exprs, out)
+    assert len(writes) > 1
+    assert out.getvalue() == parser.render_pretty_expression(exprs[0])
+
+def test_split_multibyte(tmp_path):
+    data = '|q ä|)ä)€€€; c ä\nab'.encode('utf8')
+    for parts in range(2, 9):
+        for pos in parser.split_commands(data, parts):
+            data[:pos].decode('utf8')
+    filename = tmp_path / 'input.smt2'
+    filename.write_bytes(data)
+    with pytest.raises(IndexError):
+        parser.parse_smtlib(data.decode('utf8'))
+    with pytest.raises(IndexError):
+        parser.parse_smtlib_file(str(filename), processes = 2, chunk_size = 1)
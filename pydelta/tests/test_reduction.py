@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+
+from .test_checker import WORKER_SOLVER, write_solver
+
+PYDELTA = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'bin', 'pydelta')
+
+SOLVER = '''#!{}
+import sys
+text = open(sys.argv[1]).read() if len(sys.argv) > 1 else sys.stdin.read()
+print('unsat' if 'false' in text and 'check-sat' in text else 'sat')
+'''
+
+STDIN_SOLVER = '''#!{}
+import sys
+assert len(sys.argv) == 1
+text = sys.stdin.read()
+print('unsat' if 'false' in text and 'check-sat' in text else 'sat')
+'''
+
+SLOW_SOLVER = '''#!{}
+import sys
+import time
+text = open(sys.argv[1]).read()
+if 'x' not in text:
+    time.sleep(1.5)
+print('unsat' if 'false' in text and 'check-sat' in text else 'sat')
+'''
+
+INPUT = '''(set-logic QF_UF)
+(declare-const x Bool)
+(declare-const y Bool)
+(assert (or x y))
+(assert (and x (not y) false))
+(check-sat)
+'''
+
+def reduce(tmp_path, solver, *args):
+    """Runs pydelta with :code:`args` on :code:`INPUT` and returns the reduced output."""
+    inputfile = tmp_path / 'input.smt2'
+    inputfile.write_text(INPUT)
+    outputfile = tmp_path / 'output.smt2'
+    cmd = [sys.executable, PYDELTA, '--max-threads', '2', '--outputfile', str(outputfile), *args, str(inputfile), solver]
+    res = subprocess.run(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT, timeout = 300)
+    assert res.returncode == 0, res.stdout.decode('utf8')
+    return outputfile.read_text()
+
+def check_reduced(output):
+    assert 'false' in output and 'check-sat' in output
+    assert len(output) < len(INPUT) / 3
+
+def test_asyncio(tmp_path):
+    check_reduced(reduce(tmp_path, write_solver(tmp_path, SOLVER), '--engine', 'asyncio'))
+
+def test_batch_commit(tmp_path):
+    check_reduced(reduce(tmp_path, write_solver(tmp_path, SOLVER), '--batch-commit'))
+
+def test_hdd(tmp_path):
+    check_reduced(reduce(tmp_path, write_solver(tmp_path, SOLVER), '--mode-hdd'))
+
+def test_input_modes(tmp_path):
+    solver = write_solver(tmp_path, SOLVER)
+    for mode in ['file', 'memfd']:
+        check_reduced(reduce(tmp_path, solver, '--input-mode', mode, '--input-dir', str(tmp_path)))
+    check_reduced(reduce(tmp_path, write_solver(tmp_path, STDIN_SOLVER), '--input-mode', 'stdin'))
+
+def test_adaptive_timeout(tmp_path):
+    check_reduced(reduce(tmp_path, write_solver(tmp_path, SOLVER), '--adaptive-timeout'))
+
+def test_retry_timeouts(tmp_path):
+    # candidates without variables always time out at first
+    output = reduce(tmp_path, write_solver(tmp_path, SLOW_SOLVER), '--timeout', '1', '--retry-timeouts', '3')
+    check_reduced(output)
+    assert 'x' not in output
+
+def test_adaptive_threads(tmp_path):
+    check_reduced(reduce(tmp_path, write_solver(tmp_path, SOLVER), '--adaptive-threads'))
+
+def test_cache_dir(tmp_path):
+    solver = write_solver(tmp_path, SOLVER)
+    cache_dir = tmp_path / 'cache'
+    first = reduce(tmp_path, solver, '--cache-dir', str(cache_dir))
+    check_reduced(first)
+    assert list(cache_dir.glob('*/*.json'))
+    assert reduce(tmp_path, solver, '--cache-dir', str(cache_dir)) == first
+
+def test_worker_modes(tmp_path):
+    solver = write_solver(tmp_path, WORKER_SOLVER)
+    for mode in ['reset', 'push-pop']:
+        check_reduced(reduce(tmp_path, solver, '--worker-mode', mode))
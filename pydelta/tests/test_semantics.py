@@ -0,0 +1,49 @@
+from .. import semantics
+
+def test_find_difference():
+    a = [['assert', ['and', 'x', 'y']], ['check-sat']]
+    assert semantics.find_difference(a, a) is None
+    assert semantics.find_difference(a, [['assert', ['and', 'x', 'z']], ['check-sat']]) == [0, 1, 2]
+    assert semantics.find_difference(a, [['assert', ['and', 'x']], ['check-sat']]) == [0, 1]
+    assert semantics.find_difference(a, [['assert', 'x'], ['exit']]) == []
+
+def test_replace_subtree():
+    a = [['assert', ['and', 'x', 'y']], ['check-sat']]
+    b = semantics.replace_subtree(a, [0, 1, 2], 'z')
+    assert b == [['assert', ['and', 'x', 'z']], ['check-sat']]
+    assert a == [['assert', ['and', 'x', 'y']], ['check-sat']]
+    assert b[1] is a[1]
+    assert semantics.get_subtree(b, [0, 1]) == ['and', 'x', 'z']
+
+def test_return_types():
+    term = ['bvadd', 'x', 'y']
+    a = [['declare-const', 'x', ['_', 'BitVec', '8']], ['declare-const', 'y', ['_', 'BitVec', '8']], ['assert', ['=', term, 'x']]]
+    semantics.collect_information(a)
+    assert semantics.get_return_type(term) == ['_', 'BitVec', '8']
+    assert semantics.get_return_type(a[2][1]) == 'Bool'
+    # the term is shared, but the declarations have changed
+    b = [['declare-const', 'x', ['_', 'BitVec', '4']], ['declare-const', 'y', ['_', 'BitVec', '4']], a[2]]
+    semantics.collect_information(b)
+    assert semantics.get_bitvector_width(term) == 4
+
+def test_get_head():
+    assert semantics.get_head('x') is semantics.LEAF
+    assert semantics.get_head(['and', 'x', 'y']) == 'and'
+    assert semantics.get_head([['_', 'extract', '1', '0'], 'x']) is None
+
+def test_indexed_substitute():
+    a = [['declare-const', 'x', 'Int'], ['assert', ['>', 'x', '0']], ['assert', ['<', 'y', '1']]]
+    semantics.collect_information(a)
+    assert semantics.contains(a[1], 'x')
+    assert not semantics.contains(a[2], 'x')
+    b = semantics.substitute(a, {'x': 'z'})
+    assert b == [['declare-const', 'z', 'Int'], ['assert', ['>', 'z', '0']], ['assert', ['<', 'y', '1']]]
+    assert b[2] is a[2]
+    assert semantics.substitute(['and', a[1][1], 'x'], {'x': 'z'}) == ['and', ['>', 'z', '0'], 'z']
+
+def test_get_variables_with_type():
+    a = [['declare-fun', 'y', [], 'Int'], ['declare-const', 'x', 'Int'], ['declare-const', 'b', ['_', 'BitVec', '8']]]
+    semantics.collect_information(a)
+    assert semantics.get_variables_with_type('Int') == ['x', 'y']
+    assert semantics.get_variables_with_type(['_', 'BitVec', '8']) == ['b']
+    assert semantics.get_variables_with_type('Real') == []
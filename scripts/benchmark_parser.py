@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+# run from the repository root: python3 -m scripts.benchmark_parser <inputfile>
+
+import os
+import sys
+import time
+
+from pydelta import parser
+
+filename = sys.argv[1]
+size = os.path.getsize(filename) / 1024 / 1024
+
+def parse_token_stream():
+    """Parses the file from the token stream of parser.lexer(), one S-expression after another."""
+    tokens = parser.lexer(open(filename).read())
+    exprs = []
+    while True:
+        try:
+            exprs.append(parser.parse_expression(tokens))
+        except StopIteration:
+            return exprs
+
+def parse_file():
+    """Parses the file using parser.parse_smtlib_file()."""
+    return parser.parse_smtlib_file(filename)
+
+results = {}
+for name, parse in [('token stream', parse_token_stream), ('bulk', parse_file)]:
+    before = time.perf_counter()
+    results[name] = parse()
+    duration = time.perf_counter() - before
+    print('{:>12}: {:.2f} seconds, {:.2f} MB/s'.format(name, duration, size / duration))
+
+if results['token stream'] != results['bulk']:
+    print('The results differ!')
+    sys.exit(1)